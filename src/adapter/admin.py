@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import UserAccount, AdminAccount, ReceiveWebhook, ReceiveTransaction, SendTransaction
+from .models import UserAccount, AdminAccount, ReceiveWebhook, ReceiveTransaction, SendTransaction, ChannelAccount, \
+    ArchivedTransaction
 
 
 class CustomModelAdmin(admin.ModelAdmin):
@@ -17,6 +18,10 @@ class AdminAccountAdmin(CustomModelAdmin):
     pass
 
 
+class ChannelAccountAdmin(CustomModelAdmin):
+    pass
+
+
 class ReceiveWebhookAdmin(CustomModelAdmin):
     pass
 
@@ -27,8 +32,14 @@ class ReceiveTransactionAdmin(CustomModelAdmin):
 class SendTransactionAdmin(CustomModelAdmin):
     pass
 
+
+class ArchivedTransactionAdmin(CustomModelAdmin):
+    pass
+
 admin.site.register(SendTransaction, SendTransactionAdmin)
 admin.site.register(ReceiveTransaction, ReceiveTransactionAdmin)
+admin.site.register(ArchivedTransaction, ArchivedTransactionAdmin)
 admin.site.register(UserAccount, UserAccountAdmin)
 admin.site.register(AdminAccount, AdminAccountAdmin)
+admin.site.register(ChannelAccount, ChannelAccountAdmin)
 admin.site.register(ReceiveWebhook, ReceiveWebhookAdmin)
@@ -0,0 +1,103 @@
+"""
+Conversions between decimal amounts and integer base units.
+
+Stellar amounts always have 7 decimal places (stroops). Amounts are exchanged with Rehive as integers
+in units of REHIVE_AMOUNT_DIVISIBILITY decimal places (8 unless configured), which can be overridden
+per asset code with REHIVE_ASSET_DIVISIBILITIES.
+
+Unless a rounding mode is given, amounts that cannot be represented exactly are rounded towards zero,
+so the adapter never credits or sends more than the original amount.
+"""
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP
+
+from django.conf import settings
+
+STELLAR_DIVISIBILITY = 7
+
+REHIVE_DIVISIBILITY = getattr(settings, 'REHIVE_AMOUNT_DIVISIBILITY', 8)
+REHIVE_ASSET_DIVISIBILITIES = getattr(settings, 'REHIVE_ASSET_DIVISIBILITIES', {})
+
+# Decimal places supported by MoneyField:
+MAX_DIVISIBILITY = 18
+
+# Powers of ten by divisibility:
+SCALES = tuple(10 ** places for places in range(MAX_DIVISIBILITY + 1))
+
+
+def rehive_divisibility(asset_code) -> int:
+    return REHIVE_ASSET_DIVISIBILITIES.get(asset_code, REHIVE_DIVISIBILITY)
+
+
+def to_units(amount, divisibility: int, rounding=ROUND_DOWN) -> int:
+    """
+    Converts a decimal amount to integer base units of the given divisibility.
+    """
+    return int(Decimal(amount).scaleb(divisibility).to_integral_value(rounding=rounding))
+
+
+def from_units(units, divisibility: int) -> Decimal:
+    """
+    Converts integer base units of the given divisibility to an exact decimal amount.
+    """
+    return Decimal(units).scaleb(-divisibility)
+
+
+def rescale(units: int, from_divisibility: int, to_divisibility: int, rounding=ROUND_DOWN) -> int:
+    """
+    Converts integer base units between divisibilities using integer arithmetic only.
+    """
+    if to_divisibility >= from_divisibility:
+        return units * SCALES[to_divisibility - from_divisibility]
+
+    factor = SCALES[from_divisibility - to_divisibility]
+    quotient, remainder = divmod(abs(units), factor)
+    if rounding == ROUND_DOWN:
+        pass
+    elif rounding == ROUND_UP:
+        quotient += remainder > 0
+    elif rounding == ROUND_HALF_UP:
+        quotient += 2 * remainder >= factor
+    elif rounding == ROUND_HALF_EVEN:
+        quotient += 2 * remainder > factor or (2 * remainder == factor and quotient % 2 == 1)
+    else:
+        raise ValueError('Unsupported rounding mode: %s' % (rounding,))
+
+    return -quotient if units < 0 else quotient
+
+
+def parse_amount(value: str, divisibility: int=STELLAR_DIVISIBILITY) -> int:
+    """
+    Parses a decimal amount string, such as a Horizon amount, into integer base units without using Decimal.
+    Amounts with more significant decimal places than the divisibility are rejected.
+    """
+    digits = value[1:] if value[:1] in ('-', '+') else value
+    whole, point, fraction = digits.partition('.')
+    if not (whole or fraction) or not (whole or '0').isdigit() or not (fraction or '0').isdigit():
+        raise ValueError('Invalid amount: %r' % (value,))
+
+    if len(fraction) > divisibility:
+        if fraction[divisibility:].strip('0'):
+            raise ValueError('Amount %r has more than %s decimal places.' % (value, divisibility))
+        fraction = fraction[:divisibility]
+
+    units = int(whole or '0') * SCALES[divisibility] + int(fraction.ljust(divisibility, '0') or '0')
+    return -units if value[:1] == '-' else units
+
+
+def parse_amounts(values, divisibility: int=STELLAR_DIVISIBILITY) -> list:
+    return [parse_amount(value, divisibility) for value in values]
+
+
+def to_rehive_units(amount, asset_code, rounding=ROUND_DOWN) -> int:
+    """
+    Converts a decimal amount to the integer amount sent to Rehive for the asset.
+    """
+    return to_units(amount, rehive_divisibility(asset_code), rounding)
+
+
+def from_rehive_units(units, asset_code, rounding=ROUND_DOWN) -> Decimal:
+    """
+    Converts an integer amount received from Rehive for the asset to a decimal amount in whole stroops.
+    """
+    stroops = rescale(int(units), rehive_divisibility(asset_code), STELLAR_DIVISIBILITY, rounding)
+    return from_units(stroops, STELLAR_DIVISIBILITY)
@@ -1,22 +1,118 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
-
-from .exceptions import NotImplementedAPIError
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+
+from .cache import get_shared_cache, get_user_accounts, asset_registry, is_known_destination, remember_destination, \
+    forget_destination
+from .exceptions import NotImplementedAPIError, TransactionSubmitFailedError
 from .stellar_federation import get_federation_details, address_from_domain
-from .utils import to_cents, create_qr_code_url
+from .amounts import STELLAR_DIVISIBILITY, from_units, parse_amount, parse_amounts
+from .utils import create_qr_code_url
 
-from decimal import Decimal
-from .models import SendTransaction, UserAccount, ReceiveTransaction, AdminAccount, Asset
+from .models import SendTransaction, UserAccount, ReceiveTransaction, AdminAccount, Asset, ChannelAccount
 from celery import shared_task
 
 from stellar_base.address import Address
 from stellar_base.builder import Builder
 from stellar_base.exceptions import APIException
+from stellar_base.memo import NoneMemo
 
 logger = getLogger('django')
 
+# Maximum page size supported by Horizon:
+RECEIVE_PAGE_SIZE = 200
+
+# Payment classes that credit a user:
+ACTIONABLE_PAYMENTS = ('incoming', 'path_payment')
+
+# Maximum number of payment operations packed into one Stellar transaction:
+SEND_BATCH_SIZE = min(getattr(settings, 'STELLAR_SEND_BATCH_SIZE', 100), 100)
+
+# Attempts made for a send that could not be processed, and the delay before the first retry, which doubles after each:
+SEND_MAX_RETRIES = getattr(settings, 'STELLAR_SEND_MAX_RETRIES', 8)
+SEND_RETRY_DELAY = getattr(settings, 'STELLAR_SEND_RETRY_DELAY', 10)
+
+# Namespace of the Postgres advisory locks taken on admin account ids while sending from their own sequence number:
+SEND_LOCK_NAMESPACE = 1
+
+# Whether to keep the Horizon payment record (without links) on each ReceiveTransaction:
+STORE_RAW_PAYLOADS = getattr(settings, 'STELLAR_STORE_RAW_PAYLOADS', False)
+
+# Seconds for which cached balances are fresh, and for which they may still be served while refreshing:
+BALANCE_CACHE_TTL = getattr(settings, 'STELLAR_BALANCE_CACHE_TTL', 30)
+BALANCE_STALE_TTL = getattr(settings, 'STELLAR_BALANCE_STALE_TTL', 300)
+
+# Number of Horizon transaction lookups made concurrently while processing a page:
+MEMO_FETCH_WORKERS = getattr(settings, 'STELLAR_MEMO_FETCH_WORKERS', 10)
+
+# Keep-alive connections to Horizon shared by all lookups in the process:
+_horizon_session = None
+_horizon_session_pid = None
+_horizon_session_lock = threading.Lock()
+
+
+def get_horizon_session() -> requests.Session:
+    """
+    Returns the Horizon session for the current process.
+    A new session is created after a fork so that pooled connections are never shared between processes.
+    """
+    global _horizon_session, _horizon_session_pid
+    with _horizon_session_lock:
+        if _horizon_session is None or _horizon_session_pid != os.getpid():
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_maxsize=MEMO_FETCH_WORKERS))
+            session.mount('http://', HTTPAdapter(pool_maxsize=MEMO_FETCH_WORKERS))
+            _horizon_session = session
+            _horizon_session_pid = os.getpid()
+        return _horizon_session
+
+
+def _result_codes(payload):
+    # Horizon explains rejected transactions with result codes. Without them, the outcome is unknown:
+    if isinstance(payload, dict):
+        return payload.get('extras', {}).get('result_codes') or None
+    return None
+
+
+def _is_unavailable(exc) -> bool:
+    """
+    Whether an error came from Horizon or a federation server failing or being unreachable,
+    rather than from the request made to it.
+    """
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return exc.response is None or exc.response.status_code >= 500 or exc.response.status_code == 429
+    if isinstance(exc, requests.exceptions.RequestException):
+        return True
+    if isinstance(exc, APIException):
+        status_code = getattr(exc, 'status_code', None)
+        return status_code is None or status_code >= 500 or status_code == 429
+    return False
+
+
+def _horizon_url():
+    # None selects the public Horizon server of the account's network:
+    return getattr(settings, 'STELLAR_HORIZON_URL', None) or None
+
+
+def _fetch_horizon_resource(url):
+    response = get_horizon_session().get(url=url, timeout=getattr(settings, 'STELLAR_HORIZON_TIMEOUT', 10))
+    # Fail the page rather than ingest payments without their memos:
+    response.raise_for_status()
+    return response.json()
+
 
 class AbstractBaseInteface:
     """
@@ -74,81 +170,185 @@ class Interface:
     """
     def __init__(self, account):
         self.account = account
-        if account.secret:
-            self.builder = Builder(secret=account.secret,
-                                   network=account.network)
+        self.version = get_account_version(account)
         self.address = Address(address=account.account_id,
-                               network=account.network)
-
-    def _get_new_receives(self):
-        # Get all stored transactions for account
-        transactions = ReceiveTransaction.filter(admin_account=self.account)
+                               network=account.network,
+                               horizon=_horizon_url())
+        # Number of ingested payments by class:
+        self.receive_stats = Counter()
+        # Builders are kept per secret, so keypairs are only derived once:
+        self._builders = {}
+        self.lock = threading.RLock()
+
+    def _get_builder(self, secret, sequence=None):
+        """
+        Returns a builder for the secret with all transaction state cleared.
+        The sequence number is fetched from Horizon if it is not known.
+        """
+        key = json.dumps(secret, sort_keys=True)
+        builder = self._builders.get(key)
+        if builder is None:
+            builder = Builder(secret=secret, network=self.account.network, sequence=sequence,
+                              horizon=_horizon_url())
+            self._builders[key] = builder
+        else:
+            builder.ops = []
+            builder.time_bounds = []
+            builder.memo = NoneMemo()
+            builder.fee = None
+            builder.tx = None
+            builder.te = None
+            builder.sequence = sequence if sequence else builder.get_sequence()
+
+        return builder
+
+    def _get_cursor(self):
+        # Resume from the cursor persisted on the account, which another process may have advanced:
+        self.account.receive_cursor = (AdminAccount.objects.filter(id=self.account.id)
+                                       .values_list('receive_cursor', flat=True).get())
+        if self.account.receive_cursor:
+            return self.account.receive_cursor
+
+        # Fall back to the latest stored transaction for accounts ingested before the cursor was persisted.
+        # Receives stored by the original adapter have no admin account, so they count as well:
+        paging_token = (ReceiveTransaction.objects
+                        .filter(Q(admin_account=self.account) | Q(admin_account=None))
+                        .aggregate(Max('paging_token'))['paging_token__max'])
+        if paging_token:
+            return str(paging_token)
+
+        return None
 
-        # Set the cursor according to latest stored transaction:
-        if not transactions:
-            cursor = None
+    def _get_receives(self, cursor=None):
+        """
+        Walks every page of payments after the cursor, oldest first.
+        Yields each page of records along with the paging token of its last record.
+        """
+        while True:
+            params = {'limit': RECEIVE_PAGE_SIZE, 'order': 'asc'}
+            if cursor:
+                params['cursor'] = cursor
+
+            records = self.address.payments(**params)['_embedded']['records']
+            if not records:
+                return
+
+            cursor = records[-1]['paging_token']
+            yield records, cursor
+
+            if len(records) < RECEIVE_PAGE_SIZE:
+                return
+
+    def _classify_payment(self, tx) -> str:
+        account_id = self.account.account_id
+        if tx.get('type') == 'create_account':
+            return 'create_account'
+        elif tx.get('type') not in ('payment', 'path_payment'):
+            return 'unsupported_type'
+        elif tx.get('to') != account_id:
+            return 'outgoing'
+        elif tx['asset_type'] != 'native' and asset_registry.get(tx['asset_code'], tx['asset_issuer']) is None:
+            return 'unsupported_asset'
+        elif tx['type'] == 'path_payment':
+            return 'path_payment'
         else:
-            cursor = int(transactions.latest().data['paging_token']) + 1
+            return 'incoming'
 
-        # Get new transactions from the stellar network:
-        new_transactions = self._get_receives(cursor=cursor)
+    def _filter_receives(self, transactions):
+        """
+        Yields the payments that credit the account, counting every payment by class in receive_stats.
+        """
+        for tx in transactions:
+            payment_class = self._classify_payment(tx)
+            self.receive_stats[payment_class] += 1
+            if payment_class in ACTIONABLE_PAYMENTS:
+                yield tx
 
-        return new_transactions
+    @staticmethod
+    def _compact_payload(tx) -> dict:
+        # Links can be rebuilt from the ids and make up most of a Horizon record:
+        return {key: value for key, value in tx.items() if key != '_links'}
 
-    def _get_receives(self, cursor=None):
-        # If cursor was specified, get all transactions after the cursor:
-        if cursor:
-            transactions = self.address.payments(cursor=cursor)['_embedded']['records']
-            print(transactions)
-            for i, tx in enumerate(transactions):
-                if tx.get('to') != self.account.account_id:
-                    transactions.pop(i)  # remove sends
-
-        # else just get all the transactions:
-        else:
-            transactions = self.address.payments()['_embedded']['records']
-            for i, tx in enumerate(transactions):
-                if tx.get('from') == self.account.account_id:
-                    transactions.pop(i)  # remove sends
-
-        return transactions
-
-    def _process_receive(self, tx):
-        # Get memo:
-        details = requests.get(url=tx['_links']['transaction']['href']).json()
-        memo = details.get('memo')
-        print('memo: ' + str(memo))
-        if memo:
-            account_id = memo + '*rehive.com'
-            user_account = UserAccount.objects.get(account_id=account_id)
-            user_email = user_account.user_id  # for this implementation, user_id is the user's email
-            amount = to_cents(Decimal(tx['amount']), 7)
+    def _get_transactions(self, transactions):
+        """
+        Fetches every transaction that a batch of payments belongs to.
+        Each transaction is fetched once, concurrently on a bounded pool.
+        Returns a dict of transaction hash to transaction details.
+        """
+        hrefs = {}
+        for tx in transactions:
+            hrefs[tx['transaction_hash']] = tx['_links']['transaction']['href']
+
+        if not hrefs:
+            return {}
+
+        hashes = list(hrefs.keys())
+        with ThreadPoolExecutor(max_workers=min(MEMO_FETCH_WORKERS, len(hashes))) as executor:
+            details = executor.map(_fetch_horizon_resource, [hrefs[tx_hash] for tx_hash in hashes])
+            return dict(zip(hashes, details))
+
+    def _process_receives(self, transactions):
+        """
+        Logs a batch of receive payments in the transaction table.
+        Memos and user accounts are resolved for the whole batch at once.
+        """
+        details = self._get_transactions(transactions)
+
+        # Resolve user accounts for all memos in the batch:
+        user_accounts = get_user_accounts(detail['memo'] + '*rehive.com'
+                                          for detail in details.values() if detail.get('memo'))
+
+        receives = []
+        for tx, stroops in zip(transactions, parse_amounts(tx['amount'] for tx in transactions)):
+            detail = details[tx['transaction_hash']]
+            memo = detail.get('memo')
+            if not memo:
+                logger.info('Skipping payment without memo: %s' % (tx['id'],))
+                continue
+
+            user_account = user_accounts.get(memo + '*rehive.com')
+            if not user_account:
+                logger.info('Skipping payment for unknown memo: %s' % (memo,))
+                continue
 
             if tx['asset_type'] == 'native':
-                currency = 'XLM'
+                asset = asset_registry.get_or_create(code='XLM')
                 issuer = ''
             else:
-                currency = tx['asset_code']
-                issuer_address = tx['asset_issuer']
-                issuer = Asset.objects.get(account_id=issuer_address, code=currency).issuer
-
-            # Create Transaction:
-            asset = Asset.objects.get_or_create(code=currency)
-            tx = ReceiveTransaction.objects.create(user_account=user_account,
-                                                   external_id=tx['hash'],
-                                                   recipient=user_email,
-                                                   amount=amount,
-                                                   asset=asset,
-                                                   issuer=issuer,
-                                                   status='Waiting',
-                                                   data=tx,
-                                                   metadata={'type': 'stellar'}
-                                                   )
-
-            # TODO: Move tx.upload_to_rehive() to a signal to auto-run after Transaction creation.
-            tx.upload_to_rehive()
-
-            return True
+                asset = asset_registry.get(tx['asset_code'], tx['asset_issuer'])
+                if not asset:
+                    logger.info('Skipping payment for untrusted asset: %s %s' % (tx['asset_code'],
+                                                                                  tx['asset_issuer']))
+                    continue
+                issuer = asset.issuer
+
+            # Stellar payments are final once they appear on Horizon:
+            receive = ReceiveTransaction(admin_account=self.account,
+                                         user_account=user_account,
+                                         external_id=tx['id'],
+                                         transaction_hash=tx['transaction_hash'],
+                                         recipient=user_account.rehive_id,
+                                         amount=from_units(stroops, STELLAR_DIVISIBILITY),
+                                         asset=asset,
+                                         issuer=issuer,
+                                         status='Confirmed',
+                                         paging_token=int(tx['paging_token']),
+                                         ledger=detail.get('ledger'),
+                                         source_account=tx.get('from'),
+                                         memo=memo,
+                                         ledger_created=parse_datetime(tx['created_at']),
+                                         data=self._compact_payload(tx) if STORE_RAW_PAYLOADS else {},
+                                         metadata={'type': 'stellar'})
+            receive.set_amount_units(stroops)
+            receives.append(receive)
+
+        # Log the batch, skipping payments that were already ingested:
+        tx_ids = ReceiveTransaction.objects.bulk_ingest(receives)
+
+        # Only upload once the batch and its cursor have been committed:
+        transaction.on_commit(lambda: ReceiveTransaction.objects.upload_to_rehive(tx_ids))
+
+        return len(tx_ids)
 
     @staticmethod
     def _is_valid_address(address: str) -> bool:
@@ -160,58 +360,422 @@ class Interface:
 
     # This function should always be included if transactions are received to admin account and not added via webhooks:
     def process_receives(self):
-        # Get new receive transactions
-        new_transactions = self._get_new_receives()
+        """
+        Ingests every page of new receive transactions.
+        The cursor is committed together with each page so ingestion resumes after the last committed page.
+        """
+        processed = 0
+        # Counted per run, as the interface is cached for the life of the process:
+        self.receive_stats = Counter()
+
+        for records, cursor in self._get_receives(cursor=self._get_cursor()):
+            with transaction.atomic():
+                # Lock the account so concurrent ingesters cannot process the same page twice:
+                account = AdminAccount.objects.select_for_update().get(id=self.account.id)
+                if account.receive_cursor != self.account.receive_cursor:
+                    logger.info('Receive cursor moved by another ingester, stopping.')
+                    break
+
+                # Add each transaction to Rehive and log in transaction table:
+                processed += self._process_receives(list(self._filter_receives(records)))
+
+                account.receive_cursor = cursor
+                account.save(update_fields=['receive_cursor'])
+                self.account.receive_cursor = cursor
 
-        # Add each transaction to Rehive and log in transaction table:
-        for tx in new_transactions:
-            self._process_receive(tx)
+        logger.info('Receive payments by class: %s' % (dict(self.receive_stats),))
 
-    def send(self, tx):
+        if processed:
+            self.schedule_balance_refresh()
+
+        return processed
+
+    def _get_recipient(self, tx):
+        """
+        Returns the account id and memo to send a transaction to, resolving federation addresses.
+        The memo is a (memo_type, memo) tuple, or None if no memo is required.
+        """
         if self._is_valid_address(tx.recipient):
-            address = tx.recipient
-        else:
-            federation = get_federation_details(tx.recipient)
-            if federation['memo_type'] == 'text':
-                self.builder.add_text_memo(federation['memo'])
-            elif federation['memo_type'] == 'id':
-                self.builder.add_id_memo(federation['memo'])
-            elif federation['memo_type'] == 'hash':
-                self.builder.add_hash_memo(federation['memo'])
-            else:
-                raise NotImplementedAPIError('Invalid memo type specified.')
+            return tx.recipient, None
+
+        federation = get_federation_details(tx.recipient)
+        memo_type = federation.get('memo_type')
+        if memo_type is None:
+            return federation['account_id'], None
+        elif memo_type not in ('text', 'id', 'hash'):
+            raise NotImplementedAPIError('Invalid memo type specified.')
 
-            address = federation['account_id']
+        return federation['account_id'], (memo_type, federation['memo'])
 
+    @staticmethod
+    def _add_memo(builder, memo):
+        memo_type, value = memo
+        if memo_type == 'text':
+            builder.add_text_memo(value)
+        elif memo_type == 'id':
+            builder.add_id_memo(value)
+        elif memo_type == 'hash':
+            builder.add_hash_memo(value)
+
+    def _account_exists(self, address) -> bool:
+        """
+        Checks whether a destination account exists, only asking Horizon if it is not known to exist.
+        """
+        if is_known_destination(address):
+            return True
+
+        try:
+            Address(address=address, network=self.account.network, horizon=_horizon_url()).get()
+        except APIException as exc:
+            if exc.status_code == 404:
+                return False
+            raise
+
+        remember_destination(address)
+        return True
+
+    def _append_send_op(self, builder, tx, address, source=None):
         # Create account or create payment:
         if tx.asset.code == 'XLM':
-            try:
-                address_obj = self.address
-                address_obj.get()
-                self.builder.append_payment_op(address, tx.amount, 'XLM')
-            except APIException as exc:
-                if exc.status_code == 404:
-                    self.builder.append_create_account_op(address, tx.amount)
+            if self._account_exists(address):
+                builder.append_payment_op(address, tx.get_amount(), 'XLM', source=source)
+            else:
+                builder.append_create_account_op(address, tx.get_amount(), source=source)
         else:
             # Get issuer address details:
-            issuer_address = self.get_issuer_address(tx.issuer, tx.currency)
+            issuer_address = self.get_issuer_address(tx.issuer, tx.asset.code)
+            builder.append_payment_op(address, tx.get_amount(), tx.asset.code, issuer_address,
+                                      source=source)
+
+    def _group_sends(self, txs):
+        """
+        Groups sends into Stellar transactions of at most SEND_BATCH_SIZE operations.
+        Memos apply to a whole transaction, so sends that need a memo are never packed with others.
+        """
+        packed = []
+        for tx in txs:
+            try:
+                address, memo = self._get_recipient(tx)
+            except Exception as exc:
+                # Leave the send pending so it is retried on the next run:
+                logger.exception(exc)
+                continue
+
+            if memo:
+                yield memo, [(tx, address)]
+            else:
+                packed.append((tx, address))
+                if len(packed) == SEND_BATCH_SIZE:
+                    yield None, packed
+                    packed = []
 
-            address_obj = self.address
-            address_obj.get()
-            self.builder.append_payment_op(address, tx.amount, tx.currency, issuer_address)
+        if packed:
+            yield None, packed
 
+    @staticmethod
+    def _submit(builder) -> dict:
+        """
+        Submits a signed transaction to Horizon.
+        If Horizon rejects it, the error carries the result codes. Otherwise, as after a timeout or a server error,
+        the transaction may or may not have been applied and the error carries no result codes.
+        """
         try:
-            self.builder.sign()
-            self.builder.submit()
+            response = builder.submit()
         except Exception as exc:
-            print(exc.payload)
+            payload = getattr(exc, 'payload', None)
+            raise TransactionSubmitFailedError(payload or exc, result_codes=_result_codes(payload))
 
-    def get_account_balance(self):
+        if not response.get('hash'):
+            raise TransactionSubmitFailedError(response, result_codes=_result_codes(response))
+
+        return response
+
+    @staticmethod
+    def _claim_group(group, data) -> bool:
+        """
+        Marks a group of pending sends Unknown with the hash of the transaction about to be submitted,
+        so they can be reconciled if the outcome of the submission is never recorded.
+        Returns False, claiming none of them, if any of the sends is no longer pending.
+        """
+        ids = [tx.id for tx, address in group]
+        with transaction.atomic():
+            claimed = (SendTransaction.objects.filter(id__in=ids, status='Pending')
+                       .update(status='Unknown', external_id=data['hash'], data=data))
+            if claimed < len(ids):
+                transaction.set_rollback(True)
+        return claimed == len(ids)
+
+    @staticmethod
+    def _release_group(group, error):
+        # Return sends whose transaction was rejected without being applied to pending:
+        SendTransaction.objects.filter(id__in=[tx.id for tx, address in group], status='Unknown').update(
+            status='Pending', external_id=None, data={'error': str(error)})
+        for tx, address in group:
+            tx.status = 'Pending'
+
+    def _fail_group(self, source, memo, group, error) -> list:
+        if len(group) > 1:
+            # Retry individually so that one failing payment does not fail the others:
+            return [sent for entry in group for sent in self._submit_group(source, memo, [entry])]
+
+        tx, address = group[0]
+        # The destination may have been merged since it was cached:
+        forget_destination(address)
+        SendTransaction.objects.filter(id=tx.id, status='Pending').update(status='Failed', data={'error': str(error)})
+        tx.status = 'Failed'
+        return []
+
+    def _submit_group(self, source, memo, group) -> list:
+        """
+        Submits a group of sends as one Stellar transaction from the source account.
+        The source is either the admin account itself or one of its channel accounts, in which case
+        the admin account remains the source of the payment operations and signs as well.
+
+        The sends are claimed with the transaction's hash before it is submitted, and its outcome is
+        committed as soon as it is known. Sends are only failed when they are invalid or Horizon reports that
+        their transaction failed. When the outcome is unknown they are left Unknown for reconcile_unknown_sends.
+        If Horizon or a federation server is unavailable while building the transaction, the error is raised
+        with the sends left pending.
+        """
+        is_channel = isinstance(source, ChannelAccount)
+        try:
+            builder = self._get_builder(source.secret, sequence=source.sequence)
+            if memo:
+                self._add_memo(builder, memo)
+            for tx, address in group:
+                self._append_send_op(builder, tx, address,
+                                     source=self.account.account_id if is_channel else None)
+
+            builder.sign()
+            if is_channel:
+                # Add the signature of the payment operations' source account:
+                builder.sign(secret=self.account.secret)
+            tx_hash = builder.hash_hex()
+        except Exception as exc:
+            if _is_unavailable(exc):
+                # Nothing was submitted, so leave the sends pending for the caller to retry:
+                logger.info('Could not build send transaction: %s' % (exc,))
+                raise
+
+            # The sends themselves are invalid, such as an unsupported memo or amount:
+            logger.info('Failed to build send transaction: %s' % (exc,))
+            return self._fail_group(source, memo, group, exc)
+
+        sequence = int(builder.sequence) + 1
+        if not self._claim_group(group, {'hash': tx_hash, 'source': source.account_id, 'sequence': sequence}):
+            logger.info('Sends already taken by another worker, skipping transaction %s.' % (tx_hash,))
+            return []
+
+        try:
+            response = self._submit(builder)
+        except TransactionSubmitFailedError as exc:
+            # Fetch the sequence number from Horizon on the next submit:
+            source.sequence = None
+
+            if exc.result_codes is None:
+                logger.warning('Outcome of send transaction %s unknown: %s' % (tx_hash, exc))
+                return []
+
+            logger.info('Rejected send transaction %s: %s' % (tx_hash, exc))
+            self._release_group(group, exc)
+            if exc.result_codes.get('transaction') == 'tx_failed':
+                # One of the operations failed:
+                return self._fail_group(source, memo, group, exc)
+
+            # Rejected as a whole, such as for a bad sequence number, so leave the sends pending to be retried:
+            return []
+
+        source.sequence = sequence
+        txs = [tx for tx, address in group]
+        data = {'hash': response['hash'], 'ledger': response.get('ledger')}
+        for tx in txs:
+            tx.external_id = response['hash']
+            tx.status = 'Confirmed'
+            tx.data = data
+
+        # Every send in the group is part of the same Stellar transaction:
+        SendTransaction.objects.filter(id__in=[tx.id for tx in txs]).update(external_id=response['hash'],
+                                                                            status='Confirmed', data=data)
+        return txs
+
+    @contextmanager
+    def _sequence_lock(self, channel):
+        """
+        Serializes sends from the admin account's own sequence number across processes.
+        An advisory lock is used rather than the account's row lock, which receive ingestion takes for each page.
+        Leased channels are already held by a single worker.
+        """
+        if channel:
+            yield
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s, %s)', [SEND_LOCK_NAMESPACE, self.account.id])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [SEND_LOCK_NAMESPACE, self.account.id])
+
+    def send_batch(self, txs) -> list:
+        """
+        Sends pending transactions, packing sends without a memo into shared Stellar transactions.
+
+        If the account has channel accounts, a free channel is leased as the transaction source so
+        that workers can send in parallel, renewing the lease before each group is submitted.
+        Otherwise the account's own sequence number is used, under a lock so concurrent workers
+        queue instead of colliding.
+        Each group's outcome and the source's sequence number are committed as soon as it is submitted,
+        so a later failure cannot roll back the record of a submitted transaction.
+        Returns the transactions that were sent.
+        """
+        from .rehive_api import queue_rehive_confirmation
+
+        sent = []
+        channel = ChannelAccount.objects.lease(self.account)
+        try:
+            with self.lock, self._sequence_lock(channel):
+                source = channel or AdminAccount.objects.get(id=self.account.id)
+
+                # Only send transactions that another worker has not already sent:
+                pending = (SendTransaction.objects.select_related('asset')
+                           .filter(id__in=[tx.id for tx in txs], status='Pending')
+                           .order_by('id'))
+
+                for memo, group in self._group_sends(pending):
+                    # Keep the channel for as long as the batch takes:
+                    if channel and not ChannelAccount.objects.renew(channel):
+                        logger.warning('Lease on channel %s lost, leaving the remaining sends pending.' % (channel.id,))
+                        break
+
+                    group_sent = self._submit_group(source, memo, group)
+                    type(source).objects.filter(id=source.id).update(sequence=source.sequence)
+                    if not channel:
+                        self.account.sequence = source.sequence
+
+                    for tx in group_sent:
+                        transaction.on_commit(lambda tx=tx: queue_rehive_confirmation(tx, tx_type='send'))
+                    sent.extend(group_sent)
+        finally:
+            if channel:
+                ChannelAccount.objects.release(channel)
+
+        if sent:
+            transaction.on_commit(self.schedule_balance_refresh)
+
+        return sent
+
+    def send(self, tx) -> bool:
+        return bool(self.send_batch([tx]))
+
+    def submit_pending_sends(self) -> int:
+        """
+        Sends all pending transactions of the account in batches.
+        """
+        pending = list(SendTransaction.objects.filter(admin_account=self.account, status='Pending')
+                       .order_by('id')[:SEND_BATCH_SIZE * 10])
+        return len(self.send_batch(pending))
+
+    def reconcile_unknown_sends(self) -> int:
+        """
+        Settles sends left Unknown after a submission without a definite outcome, by the recorded transaction hash.
+        Sends are confirmed if their transaction is on the ledger. They are returned to pending, and resent, once its
+        sequence number has been used by another transaction, as it can then no longer be applied.
+        Returns the number of sends that were settled.
+        """
+        from .rehive_api import queue_rehive_confirmation
+
+        groups = OrderedDict()
+        for tx in SendTransaction.objects.filter(admin_account=self.account, status='Unknown').order_by('id'):
+            groups.setdefault(tx.external_id, []).append(tx)
+
+        horizon = self.address.horizon
+        settled = 0
+        for tx_hash, txs in groups.items():
+            unknown = SendTransaction.objects.filter(id__in=[tx.id for tx in txs], status='Unknown')
+            try:
+                result = horizon.transaction(tx_hash)
+                if result.get('hash') and result.get('successful', True):
+                    unknown.update(status='Confirmed', data={'hash': tx_hash, 'ledger': result.get('ledger')})
+                    for tx in txs:
+                        transaction.on_commit(lambda tx=tx: queue_rehive_confirmation(tx, tx_type='send'))
+                elif result.get('hash'):
+                    # Failed transactions are retried, which fails the payment at fault on its own:
+                    unknown.update(status='Pending', external_id=None, data={'error': 'Transaction failed.'})
+                    self._resend(txs)
+                elif result.get('status') == 404:
+                    source = horizon.account(txs[0].data['source'])
+                    if int(source['sequence']) < txs[0].data['sequence']:
+                        # The transaction may still be applied:
+                        continue
+                    unknown.update(status='Pending', external_id=None, data={'error': 'Transaction not applied.'})
+                    self._resend(txs)
+                else:
+                    logger.info('Could not look up send transaction %s: %s' % (tx_hash, result))
+                    continue
+            except Exception as exc:
+                logger.exception(exc)
+                continue
+
+            settled += len(txs)
+
+        return settled
+
+    @staticmethod
+    def _resend(txs):
+        # Pending sends are only picked up again by submit_pending_sends in batching mode:
+        if not getattr(settings, 'STELLAR_SEND_BATCHING', False):
+            for tx in txs:
+                transaction.on_commit(lambda tx=tx: execute_send.delay(tx.id))
+
+    def _balance_cache_key(self):
+        return 'adapter:balances:%s' % (self.account.id,)
+
+    def refresh_account_balances(self) -> list:
+        """
+        Fetches the balances of all assets held by the account from Horizon and caches them.
+        """
         address = self.address
         address.get()
-        for balance in address.balances:
+        (get_shared_cache() or cache).set(self._balance_cache_key(),
+                                          {'balances': address.balances, 'fetched': time.time()},
+                                          BALANCE_CACHE_TTL + BALANCE_STALE_TTL)
+        return address.balances
+
+    def schedule_balance_refresh(self):
+        """
+        Refreshes the cached balances in a background task, if they are kept in the shared cache.
+        Without a shared cache a worker could only refresh its own copy, so balances are refreshed
+        by the process serving them instead.
+        """
+        if get_shared_cache() is not None:
+            refresh_account_balances.delay(self.account.id)
+
+    def get_account_balances(self) -> list:
+        """
+        Returns the cached balances of all assets held by the account.
+        With a shared cache, balances older than STELLAR_BALANCE_CACHE_TTL are still served while a background task
+        refreshes them. Otherwise they are refreshed before being served.
+        """
+        shared_cache = get_shared_cache()
+        cached = (shared_cache or cache).get(self._balance_cache_key())
+        if cached is None:
+            return self.refresh_account_balances()
+
+        if time.time() - cached['fetched'] > BALANCE_CACHE_TTL:
+            if shared_cache is None:
+                return self.refresh_account_balances()
+
+            # Only enqueue one refresh at a time:
+            if shared_cache.add(self._balance_cache_key() + ':refreshing', True, BALANCE_CACHE_TTL):
+                refresh_account_balances.delay(self.account.id)
+
+        return cached['balances']
+
+    def get_account_balance(self):
+        for balance in self.get_account_balances():
             if balance['asset_type'] == 'native':
-                return to_cents(Decimal(balance['balance']), 7)
+                return parse_amount(balance['balance'])
 
     def get_issuer_address(self, issuer, asset_code):
         if self._is_valid_address(issuer):
@@ -227,13 +791,23 @@ class Interface:
     def trust_issuer(self, asset_code, issuer):
         logger.info('Trusting issuer: %s %s' % (issuer, asset_code))
         address = self.get_issuer_address(issuer, asset_code)
-        self.builder.append_trust_op(address, asset_code)
 
-        try:
-            self.builder.sign()
-            self.builder.submit()
-        except Exception as exc:
-            print(exc.payload)
+        # Use the locally tracked sequence number, as for sends:
+        with self.lock, self._sequence_lock(None):
+            account = AdminAccount.objects.get(id=self.account.id)
+            builder = self._get_builder(account.secret, sequence=account.sequence)
+            builder.append_trust_op(address, asset_code)
+            builder.sign()
+
+            try:
+                self._submit(builder)
+                account.sequence = int(builder.sequence) + 1
+            except TransactionSubmitFailedError as exc:
+                logger.info('Failed trust transaction: %s' % (exc,))
+                account.sequence = None
+
+            AdminAccount.objects.filter(id=account.id).update(sequence=account.sequence)
+            self.account.sequence = account.sequence
 
     # Generate new crypto address/ account id
     @staticmethod
@@ -252,7 +826,7 @@ class Interface:
             issuer_address = self.get_issuer_address(issuer, asset_code)
 
             # Trust and create asset if it does not yet exist.
-            if not Asset.objects.filter(code=asset_code, account_id=issuer_address).exists():
+            if asset_registry.get(asset_code, issuer_address) is None:
                 self.trust_issuer(asset_code, issuer)
                 Asset.objects.create(code=asset_code, issuer=issuer, account_id=issuer_address, metadata=metadata)
             else:
@@ -271,6 +845,41 @@ class Interface:
             raise APIException('Error adding asset.')
 
 
+def get_account_version(account) -> str:
+    """
+    Identifies the credentials of an admin account, so cached interfaces are rebuilt when they change.
+    """
+    return json.dumps([account.secret, getattr(account, 'account_id', None), getattr(account, 'network', None)],
+                      sort_keys=True)
+
+
+# Interfaces per admin account id, shared by everything in the process:
+_interfaces = {}
+_interfaces_lock = threading.Lock()
+
+
+def get_interface(account) -> Interface:
+    """
+    Returns the process wide Interface for an admin account, creating it if the account is new or its
+    credentials changed. The interface always refers to the given (latest) account instance.
+    """
+    version = get_account_version(account)
+    with _interfaces_lock:
+        interface = _interfaces.get(account.id)
+        if interface is None or interface.version != version:
+            interface = Interface(account=account)
+            _interfaces[account.id] = interface
+        else:
+            interface.account = account
+
+    return interface
+
+
+def invalidate_interface(account_id):
+    with _interfaces_lock:
+        _interfaces.pop(account_id, None)
+
+
 class AbstractReceiveWebhookInterfaceBase:
     """
     If an external webhook service is used to create receive transactions,
@@ -299,10 +908,52 @@ def process_webhook_receive(webhook_type, receive_id, data):
     # TODO: add webhook logic for creating and confirming transactions here.
 
 
+@shared_task(name='adapter.refresh_account_balances.task')
+def refresh_account_balances(account_id=None):
+    if account_id:
+        account = AdminAccount.objects.get(id=account_id)
+    else:
+        account = AdminAccount.objects.get_default()
+
+    get_interface(account).refresh_account_balances()
+
+
+@shared_task(bind=True, name='adapter.execute_send.task', max_retries=SEND_MAX_RETRIES)
+def execute_send(self, tx_id):
+    tx = SendTransaction.objects.select_related('admin_account').get(id=tx_id)
+    # Back off exponentially between attempts:
+    countdown = SEND_RETRY_DELAY * 2 ** self.request.retries
+    try:
+        sent = tx.execute()
+    except Exception as exc:
+        logger.exception(exc)
+        raise self.retry(countdown=countdown, exc=exc)
+
+    # Sends that could not be processed yet, such as when the recipient could not be resolved,
+    # are left pending. Sends another worker took over are no longer pending and are not retried:
+    if not sent and SendTransaction.objects.filter(id=tx_id, status='Pending').exists():
+        raise self.retry(countdown=countdown)
+
+
+@shared_task(name='adapter.submit_pending_sends.task')
+def submit_pending_sends():
+    if not getattr(settings, 'STELLAR_SEND_BATCHING', False):
+        return
+
+    hotwallet = AdminAccount.objects.get_default()
+    get_interface(hotwallet).submit_pending_sends()
+
+
+@shared_task(name='adapter.reconcile_unknown_sends.task')
+def reconcile_unknown_sends():
+    for account in AdminAccount.objects.all():
+        get_interface(account).reconcile_unknown_sends()
+
+
 # Non-webhook implementation:
 @shared_task
 def process_receive():
     logger.info('checking stellar receive transactions...')
-    hotwallet = AdminAccount.objects.get(default=True)
-    hotwallet.process_new_transactions()
+    hotwallet = AdminAccount.objects.get_default()
+    hotwallet.process_receives()
 
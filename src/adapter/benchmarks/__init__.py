@@ -0,0 +1,4 @@
+"""
+Throughput benchmarks that drive the adapter against local Horizon and Rehive stand-ins.
+Run them with the run_benchmarks management command.
+"""
@@ -0,0 +1,172 @@
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from celery import current_app
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from stellar_base.keypair import Keypair
+
+from adapter import rehive_client
+from adapter.api import get_interface, invalidate_interface
+from adapter.cache import asset_registry
+from adapter.models import AdminAccount, UserAccount, SendTransaction, ReceiveTransaction
+from adapter.rehive_api import _flush_confirmations
+from adapter.rehive_client import RehiveClient
+from .stubs import HorizonStub, RehiveStub
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[int(round(percent / 100 * (len(ordered) - 1)))]
+
+
+def measure(name, rounds, stubs=()) -> dict:
+    """
+    Runs each round of a scenario, where a round is a callable returning the number of items it processed.
+    Reports the throughput, round latencies, database queries, outbound requests and peak traced memory.
+    """
+    for stub in stubs:
+        stub.reset_counts()
+
+    latencies = []
+    items = 0
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for run_round in rounds:
+                round_start = time.perf_counter()
+                items += run_round()
+                latencies.append(time.perf_counter() - round_start)
+            seconds = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'scenario': name,
+            'items': items,
+            'seconds': seconds,
+            'throughput': items / seconds if seconds else 0.0,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+            'queries': len(queries),
+            'requests': sum(sum(stub.request_counts().values()) for stub in stubs),
+            'peak_memory_kb': peak_memory // 1024}
+
+
+class Benchmark:
+    """
+    Drives the adapter end to end against local Horizon and Rehive stand-ins.
+
+    Must run against a disposable database: it creates a default admin account, user accounts
+    and transactions. Celery tasks run eagerly, so downstream Rehive calls are part of each scenario.
+    """
+
+    def __init__(self, users=100, batch_size=100, horizon_latency=0.0, rehive_latency=0.0, error_rate=0.0,
+                 seed=0):
+        self.users = users
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.account_keypair = self._keypair()
+        self.destinations = [self._keypair().address().decode() for i in range(10)]
+
+        self.horizon = HorizonStub(self.account_keypair.address().decode(), latency=horizon_latency,
+                                   error_rate=error_rate, seed=seed)
+        self.rehive = RehiveStub(latency=rehive_latency, error_rate=error_rate, seed=seed)
+        self.account = None
+        self.interface = None
+        self.always_eager = None
+
+    def _keypair(self):
+        return Keypair.from_raw_seed(bytes(self.random.getrandbits(8) for i in range(32)))
+
+    def setup(self):
+        self.horizon.start()
+        self.rehive.start()
+
+        # Point Horizon requests, including those made by stellar_base, at the stand-in:
+        self.settings = override_settings(STELLAR_HORIZON_URL=self.horizon.url)
+        self.settings.enable()
+        self.always_eager = current_app.conf.CELERY_ALWAYS_EAGER
+        current_app.conf.CELERY_ALWAYS_EAGER = True
+        rehive_client.set_client(RehiveClient(url=self.rehive.url, token='benchmark'))
+
+        AdminAccount.objects.update(default=False)
+        self.account = AdminAccount.objects.create(name='receive', default=True,
+                                                   account_id=self.account_keypair.address().decode(),
+                                                   network='TESTNET',
+                                                   secret=self.account_keypair.seed().decode())
+        UserAccount.objects.bulk_create(UserAccount(rehive_id='benchmark-user-%s' % (i,),
+                                                    account_id='benchmark%s*rehive.com' % (i,),
+                                                    admin_account=self.account)
+                                        for i in range(self.users))
+        invalidate_interface(self.account.id)
+        self.interface = get_interface(self.account)
+
+    def teardown(self):
+        current_app.conf.CELERY_ALWAYS_EAGER = self.always_eager
+        rehive_client.set_client(None)
+        self.settings.disable()
+        self.horizon.stop()
+        self.rehive.stop()
+
+    def _memos(self, count):
+        return ['benchmark%s' % (self.random.randrange(self.users),) for i in range(count)]
+
+    def _create_sends(self, count, status='Pending', rehive_code=True):
+        xlm = asset_registry.get_or_create(code='XLM')
+        offset = SendTransaction.objects.count()
+        SendTransaction.objects.bulk_create(
+            SendTransaction(admin_account=self.account,
+                            rehive_code='benchmark-send-%s' % (offset + i,) if rehive_code else None,
+                            recipient=self.random.choice(self.destinations),
+                            amount=Decimal('1.0000000'),
+                            asset=xlm,
+                            status=status)
+            for i in range(count))
+        return list(SendTransaction.objects.filter(admin_account=self.account, status=status)
+                    .order_by('id').values_list('id', flat=True))
+
+    def receives(self, count) -> dict:
+        """
+        Ingests `count` payments, as new pages of payments arriving between polls, and creates them on Rehive.
+        Rehive confirmations are left for the confirmations scenario.
+        """
+        def ingest():
+            self.horizon.add_payments(self._memos(self.batch_size))
+            return self.interface.process_receives()
+
+        with override_settings(REHIVE_CONFIRM_BATCHING=True):
+            return measure('receives', [ingest] * max(count // self.batch_size, 1), [self.horizon, self.rehive])
+
+    def sends(self, count) -> dict:
+        """
+        Submits `count` pending sends in batches. Rehive confirmations are left for the confirmations scenario.
+        """
+        tx_ids = self._create_sends(count)
+        batches = [tx_ids[i:i + self.batch_size] for i in range(0, len(tx_ids), self.batch_size)]
+
+        def send(batch):
+            return lambda: len(self.interface.send_batch(SendTransaction.objects.filter(id__in=batch)))
+
+        with override_settings(REHIVE_CONFIRM_BATCHING=True):
+            return measure('sends', [send(batch) for batch in batches], [self.horizon, self.rehive])
+
+    def confirmations(self, count) -> dict:
+        """
+        Adds `count` sent transactions, then confirms every confirmed send and receive on Rehive in batches.
+        """
+        self._create_sends(count, status='Confirmed')
+
+        def flush(model):
+            return lambda: _flush_confirmations(model, self.batch_size)
+
+        pending = (SendTransaction.objects.filter(status='Confirmed').exclude(rehive_code=None).count(),
+                   ReceiveTransaction.objects.filter(status='Confirmed').exclude(rehive_code=None).count())
+        rounds = ([flush(SendTransaction)] * -(-pending[0] // self.batch_size) +
+                  [flush(ReceiveTransaction)] * -(-pending[1] // self.batch_size))
+        return measure('confirmations', rounds, [self.rehive])
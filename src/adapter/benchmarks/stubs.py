@@ -0,0 +1,242 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer:
+    """
+    Local HTTP stand-in for a remote API, served from a background thread on a free port.
+
+    Every request is delayed by `latency` seconds. Requests to routes that can fail
+    are answered with an error at `error_rate`, drawn from a generator seeded with `seed`.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.url = 'http://127.0.0.1:%s' % (self.server.server_address[1],)
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request_counts(self) -> dict:
+        with self.lock:
+            return dict(self.requests)
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests.clear()
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub._dispatch(self, 'GET')
+
+            def do_POST(self):
+                stub._dispatch(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _dispatch(self, request, method):
+        url = urlparse(request.path)
+        path = url.path.rstrip('/')
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length).decode() if length else ''
+
+        with self.lock:
+            self.requests[(method, self.route(path))] += 1
+            fail = self.can_fail(method, path) and self.random.random() < self.error_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            status, data = self.error(method, path)
+        else:
+            status, data = self.handle(method, path, params, body)
+
+        payload = json.dumps(data).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def route(self, path) -> str:
+        """
+        Returns the name requests to the path are counted under.
+        """
+        return path
+
+    def can_fail(self, method, path) -> bool:
+        return True
+
+    def error(self, method, path):
+        return 503, {'status': 503, 'title': 'Service Unavailable'}
+
+    def handle(self, method, path, params, body):
+        raise NotImplementedError()
+
+
+class HorizonStub(StubServer):
+    """
+    Stand-in for the Horizon endpoints used by the adapter: account details, account payments,
+    transaction details and transaction submission.
+
+    Payments are only generated through add_payments, so ingestion is reproducible.
+    Only submissions fail at the error rate, with a transaction failure result unless
+    another `submit_error` response is set.
+    """
+    TX_FAILED = (400, {'status': 400, 'title': 'Transaction Failed',
+                       'extras': {'result_codes': {'transaction': 'tx_failed'}}})
+
+    def __init__(self, account_id, sequence=1000000, **kwargs):
+        super().__init__(**kwargs)
+        self.account_id = account_id
+        self.sequence = sequence
+        self.payments = []
+        self.transactions = {}
+        self.submitted = 0
+        self.submit_error = self.TX_FAILED
+        self.created_at = datetime(2017, 1, 1)
+
+    def add_payments(self, memos, amount='10.0000000', source=None, destination=None):
+        """
+        Appends a native payment to the account for each memo, each in its own transaction.
+        Payments with another destination are made by the account instead.
+        """
+        for memo in memos:
+            self.add_transaction(memo, [amount], source=source, destination=destination)
+
+    def add_transaction(self, memo, amounts, source=None, destination=None):
+        """
+        Appends a transaction with a native payment to the account for each amount.
+        """
+        with self.lock:
+            number = len(self.transactions) + 1
+            tx_hash = '%064x' % (number,)
+            for amount in amounts:
+                # Operation ids, which are also their paging tokens, increase across transactions:
+                operation = len(self.payments) + 1
+                self.payments.append({
+                    'id': str(operation << 12),
+                    'paging_token': str(operation << 12),
+                    'type': 'payment',
+                    'from': source or self.account_id,
+                    'to': destination or self.account_id,
+                    'asset_type': 'native',
+                    'amount': amount,
+                    'transaction_hash': tx_hash,
+                    'created_at': (self.created_at + timedelta(seconds=number)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    '_links': {'transaction': {'href': self.url + '/transactions/' + tx_hash}}})
+            self.transactions[tx_hash] = {'hash': tx_hash, 'memo_type': 'text', 'memo': memo, 'ledger': number}
+
+    def reset(self):
+        with self.lock:
+            self.payments = []
+            self.transactions = {}
+            self.submitted = 0
+
+    def route(self, path) -> str:
+        parts = path.strip('/').split('/')
+        if parts[0] == 'accounts':
+            return '/accounts/{id}' + ('/' + '/'.join(parts[2:]) if len(parts) > 2 else '')
+        elif parts[0] == 'transactions' and len(parts) > 1:
+            return '/transactions/{hash}'
+        return path
+
+    def can_fail(self, method, path) -> bool:
+        return method == 'POST'
+
+    def error(self, method, path):
+        return self.submit_error
+
+    def handle(self, method, path, params, body):
+        parts = path.strip('/').split('/')
+
+        if method == 'GET' and parts[0] == 'accounts' and len(parts) == 3 and parts[2] == 'payments':
+            return 200, self._payments_page(params)
+        elif method == 'GET' and parts[0] == 'accounts' and len(parts) == 2:
+            return 200, {'id': parts[1], 'account_id': parts[1], 'sequence': str(self.sequence),
+                         'balances': [{'asset_type': 'native', 'balance': '100000000.0000000'}]}
+        elif method == 'GET' and parts[0] == 'transactions' and len(parts) == 2:
+            with self.lock:
+                detail = self.transactions.get(parts[1])
+            if detail is None:
+                return 404, {'status': 404, 'title': 'Resource Missing'}
+            return 200, detail
+        elif method == 'POST' and parts == ['transactions']:
+            with self.lock:
+                self.submitted += 1
+                number = self.submitted
+            return 200, {'hash': '%064x' % (10 ** 12 + number,), 'ledger': number}
+
+        return 404, {'status': 404, 'title': 'Resource Missing'}
+
+    def _payments_page(self, params) -> dict:
+        cursor = int(params.get('cursor') or 0)
+        limit = int(params.get('limit') or 10)
+        with self.lock:
+            records = [payment for payment in self.payments if int(payment['paging_token']) > cursor][:limit]
+        return {'_embedded': {'records': records}}
+
+
+class RehiveStub(StubServer):
+    """
+    Stand-in for the Rehive admin transaction endpoints.
+    Every request fails at the error rate with a gateway error, which the client retries.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.created = 0
+
+    def error(self, method, path):
+        return 503, {'status': 'error', 'message': 'Service unavailable.'}
+
+    def handle(self, method, path, params, body):
+        if method == 'POST' and path == '/admins/transactions/receive':
+            with self.lock:
+                self.created += 1
+                tx_code = 'benchmark-%s' % (self.created,)
+            return 201, {'status': 'success', 'data': {'tx_code': tx_code}}
+        elif method == 'POST' and path == '/admins/transactions/update':
+            data = json.loads(body or '{}')
+            return 200, {'status': 'success', 'data': {'tx_code': data.get('tx_code'), 'status': data.get('status')}}
+
+        return 404, {'status': 'error', 'message': 'Not found.'}
@@ -0,0 +1,246 @@
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+
+from django.conf import settings
+from django.db import transaction
+
+logger = getLogger('django')
+
+_missing = object()
+
+
+def get_shared_cache():
+    """
+    Returns the cache shared by all worker processes, if ADAPTER_SHARED_CACHE names a configured cache alias.
+    """
+    alias = getattr(settings, 'ADAPTER_SHARED_CACHE', None)
+    if alias:
+        from django.core.cache import caches
+        return caches[alias]
+
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class TTLCache:
+    """
+    Thread safe in-process LRU cache with per entry expiry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            expires, value = self._data.get(key, (None, _missing))
+            if value is _missing:
+                return default
+
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader, ttl=None, error_ttl=None):
+        """
+        Returns the cached value for key, calling loader to fill it on a miss.
+        Concurrent misses for the same key wait for a single call to loader.
+        If error_ttl is given, exceptions raised by loader are cached for that long and re-raised.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            with self._lock:
+                key_lock = self._loading.setdefault(key, threading.Lock())
+
+            with key_lock:
+                # Another thread may have loaded the value while we waited:
+                value = self.get(key, _missing)
+                if value is _missing:
+                    try:
+                        value = loader()
+                        self.set(key, value, ttl)
+                    except Exception as exc:
+                        if error_ttl is None:
+                            raise
+                        value = _Failure(exc)
+                        self.set(key, value, error_ttl)
+                    finally:
+                        with self._lock:
+                            self._loading.pop(key, None)
+
+        if isinstance(value, _Failure):
+            raise value.exc
+
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Stellar address (memo*domain) to UserAccount:
+user_account_cache = TTLCache(maxsize=getattr(settings, 'ADAPTER_USER_ACCOUNT_CACHE_SIZE', 100000),
+                              ttl=getattr(settings, 'ADAPTER_USER_ACCOUNT_CACHE_TTL', 300))
+
+
+def get_user_accounts(account_ids) -> dict:
+    from .models import UserAccount
+    """
+    Resolves a batch of account ids to user accounts, querying only for those not cached.
+    Returns a dict of account id to UserAccount. Unknown account ids are omitted.
+    """
+    user_accounts = {}
+    missing = []
+    for account_id in set(account_ids):
+        user_account = user_account_cache.get(account_id)
+        if user_account is None:
+            missing.append(account_id)
+        else:
+            user_accounts[account_id] = user_account
+
+    if missing:
+        for user_account in UserAccount.objects.filter(account_id__in=missing):
+            user_account_cache.set(user_account.account_id, user_account)
+            user_accounts[user_account.account_id] = user_account
+
+    return user_accounts
+
+
+# Admin accounts by default flag or name:
+admin_account_cache = TTLCache(maxsize=100, ttl=getattr(settings, 'ADAPTER_ADMIN_ACCOUNT_CACHE_TTL', 60))
+
+
+# Seconds between checks of the shared asset registry generation:
+ASSET_GENERATION_CHECK_INTERVAL = getattr(settings, 'ADAPTER_ASSET_GENERATION_CHECK_INTERVAL', 5)
+
+
+class AssetRegistry:
+    """
+    Process wide registry of all assets, loaded once and served from memory.
+
+    The registry is reloaded when an asset is saved or deleted in this process. If
+    ADAPTER_SHARED_CACHE names a configured cache alias, a generation key in that
+    cache is bumped once every change is committed, and checked at most every
+    ADAPTER_ASSET_GENERATION_CHECK_INTERVAL seconds, so that all worker processes reload as well.
+    """
+    generation_key = 'adapter:assets:generation'
+
+    def __init__(self):
+        self._assets = None
+        self._generation = None
+        self._checked = 0
+        self._lock = threading.RLock()
+
+    def _get_assets(self) -> dict:
+        from .models import Asset
+        with self._lock:
+            if self._assets is not None and time.time() - self._checked < ASSET_GENERATION_CHECK_INTERVAL:
+                return self._assets
+
+            shared_cache = get_shared_cache()
+            generation = shared_cache.get(self.generation_key) if shared_cache else None
+            if self._assets is None or generation != self._generation:
+                logger.info('Loading asset registry.')
+                self._assets = {(asset.code, asset.account_id or None): asset for asset in Asset.objects.all()}
+                self._generation = generation
+
+            self._checked = time.time()
+            return self._assets
+
+    def get(self, code, account_id=None):
+        """
+        Returns the asset for a code and issuer account id, or None if it does not exist.
+        """
+        return self._get_assets().get((code, account_id or None))
+
+    def get_or_create(self, code, account_id=None, **defaults):
+        """
+        Returns the asset for a code and issuer account id, creating it if necessary.
+        If no issuer account id is given, any asset with the code is returned.
+        """
+        from .models import Asset
+        assets = self._get_assets()
+        if account_id:
+            asset = assets.get((code, account_id))
+        else:
+            asset = assets.get((code, None)) or next(
+                (asset for (asset_code, _), asset in assets.items() if asset_code == code), None)
+
+        if asset is None:
+            asset, created = Asset.objects.get_or_create(code=code, account_id=account_id or None, defaults=defaults)
+
+        return asset
+
+    def invalidate(self):
+        """
+        Reloads the registry in this process, and in all others once the current transaction is committed.
+        """
+        self._clear()
+        transaction.on_commit(self._publish)
+
+    def _clear(self):
+        with self._lock:
+            self._assets = None
+
+    def _publish(self):
+        # Clear again, in case the registry was reloaded before the change was committed:
+        self._clear()
+        shared_cache = get_shared_cache()
+        if shared_cache:
+            shared_cache.set(self.generation_key, time.time(), None)
+
+
+asset_registry = AssetRegistry()
+
+
+# Destination accounts known to exist on the Stellar network.
+# Accounts only disappear when merged, so entries are kept for a long time:
+destination_cache = TTLCache(maxsize=getattr(settings, 'STELLAR_DESTINATION_CACHE_SIZE', 100000),
+                             ttl=getattr(settings, 'STELLAR_DESTINATION_CACHE_TTL', 24 * 60 * 60))
+
+
+def is_known_destination(account_id) -> bool:
+    if destination_cache.get(account_id):
+        return True
+
+    shared_cache = get_shared_cache()
+    if shared_cache and shared_cache.get('adapter:destination:' + account_id):
+        destination_cache.set(account_id, True)
+        return True
+
+    return False
+
+
+def remember_destination(account_id):
+    destination_cache.set(account_id, True)
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        shared_cache.set('adapter:destination:' + account_id, True, destination_cache.ttl)
+
+
+def forget_destination(account_id):
+    destination_cache.delete(account_id)
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        shared_cache.delete('adapter:destination:' + account_id)
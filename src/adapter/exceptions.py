@@ -28,3 +28,13 @@ class AdapterError(Exception):
 class PlatformRequestFailedError(AdapterError):
     default_detail = 'Adapter platform request post failed.'
     default_error_slug = 'adapter_platform_failed_error.'
+
+
+class TransactionSubmitFailedError(AdapterError):
+    default_detail = 'Stellar transaction submission failed.'
+    default_error_slug = 'transaction_submit_failed_error'
+
+    def __init__(self, detail=None, error_slug=None, result_codes=None):
+        super(TransactionSubmitFailedError, self).__init__(detail, error_slug)
+        # Horizon's result codes if the transaction was rejected, or None if its outcome is unknown:
+        self.result_codes = result_codes
@@ -0,0 +1,81 @@
+import gzip
+import json
+from datetime import timedelta
+from logging import getLogger
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from adapter.models import ArchivedTransaction, ReceiveTransaction, SendTransaction
+
+logger = getLogger('django')
+
+
+class Command(BaseCommand):
+    help = ('Moves Complete transactions older than the retention period out of the transaction tables, '
+            'into the archive table or a gzipped JSON lines export.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', dest='days', type=int,
+                            default=getattr(settings, 'ADAPTER_ARCHIVE_AFTER_DAYS', 90),
+                            help='Archive transactions created more than this many days ago.')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=1000,
+                            help='Number of transactions moved per database transaction.')
+        parser.add_argument('--export', dest='export', default=None,
+                            help='Append archived transactions to this gzipped JSON lines file '
+                                 'instead of the archive table. Only the keys of receives are kept in the table.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        for tx_type, model in (('send', SendTransaction), ('receive', ReceiveTransaction)):
+            archived = 0
+            while True:
+                count = self._archive_batch(tx_type, model, cutoff, options['batch_size'], options['export'])
+                if not count:
+                    break
+                archived += count
+
+            logger.info('Archived %s %s transactions.' % (archived, tx_type))
+
+    @staticmethod
+    def _archive_batch(tx_type, model, cutoff, batch_size, export) -> int:
+        with transaction.atomic():
+            txs = list(model.objects.select_for_update()
+                       .filter(status='Complete', created__lt=cutoff)
+                       .order_by('id')[:batch_size])
+            if not txs:
+                return 0
+
+            records = []
+            for tx, serialized in zip(txs, serializers.serialize('python', txs)):
+                # Round trip through JSON so decimals and dates are stored as strings:
+                data = json.loads(json.dumps(serialized['fields'], cls=DjangoJSONEncoder))
+                records.append(ArchivedTransaction(tx_type=tx_type,
+                                                   original_id=tx.id,
+                                                   admin_account_id=tx.admin_account_id,
+                                                   external_id=tx.external_id,
+                                                   rehive_code=tx.rehive_code,
+                                                   created=tx.created,
+                                                   data=data))
+
+            if export:
+                with gzip.open(export, 'at') as f:
+                    for record in records:
+                        f.write(json.dumps({'tx_type': record.tx_type,
+                                            'original_id': record.original_id,
+                                            'data': record.data}) + '\n')
+                if tx_type == 'receive':
+                    # Keep the keys of exported receives, so that replayed payments are not ingested again:
+                    for record in records:
+                        record.data = {}
+                    ArchivedTransaction.objects.bulk_create(records)
+            else:
+                ArchivedTransaction.objects.bulk_create(records)
+
+            model.objects.filter(id__in=[tx.id for tx in txs]).delete()
+            return len(txs)
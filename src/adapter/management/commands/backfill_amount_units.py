@@ -0,0 +1,66 @@
+from logging import getLogger
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from adapter.amounts import SCALES, STELLAR_DIVISIBILITY
+from adapter.models import STORE_AMOUNT_UNITS, ReceiveTransaction, SendTransaction
+
+logger = getLogger('django')
+
+# Largest value of a BIGINT column:
+MAX_UNITS = 2 ** 63 - 1
+
+# Amounts are converted to stroops, truncating anything finer than a stroop. Legacy amounts were
+# stored in stroops already, so they are kept as the units and converted back to decimal amounts:
+BACKFILL_SQL = '''
+UPDATE {table} SET
+    amount_units = CASE WHEN {legacy} THEN trunc(amount) ELSE trunc(amount * %(scale)s) END,
+    amount = CASE WHEN {legacy} THEN amount / %(scale)s ELSE amount END,
+    amount_divisibility = %(divisibility)s
+WHERE id > %(start)s AND id <= %(end)s AND amount_units IS NULL AND amount IS NOT NULL
+AND abs(CASE WHEN {legacy} THEN trunc(amount) ELSE trunc(amount * %(scale)s) END) <= %(max_units)s
+'''
+
+
+class Command(BaseCommand):
+    help = ('Stores integer amounts in stroops for transactions saved before ADAPTER_STORE_AMOUNT_UNITS was '
+            'enabled, a batch of ids at a time. Receives saved by the original adapter, which stored amounts '
+            'in stroops, are rescaled.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=10000,
+                            help='Number of ids updated per database transaction.')
+        parser.add_argument('--legacy-receive-max-id', dest='legacy_receive_max_id', type=int, default=None,
+                            help='Highest id of receives that store amounts in stroops. Defaults to receives '
+                                 'without an admin account, which the original adapter did not set.')
+
+    def handle(self, *args, **options):
+        if not STORE_AMOUNT_UNITS:
+            raise CommandError('Enable ADAPTER_STORE_AMOUNT_UNITS before backfilling, '
+                               'or new transactions will not store their units.')
+
+        if options['legacy_receive_max_id'] is not None:
+            legacy_receives = 'id <= %d' % (options['legacy_receive_max_id'],)
+        else:
+            legacy_receives = 'admin_account_id IS NULL'
+
+        for model, legacy in ((ReceiveTransaction, legacy_receives), (SendTransaction, 'FALSE')):
+            self._backfill(model, legacy, options['batch_size'])
+
+    @staticmethod
+    def _backfill(model, legacy, batch_size):
+        table = model._meta.db_table
+        sql = BACKFILL_SQL.format(table=connection.ops.quote_name(table), legacy=legacy)
+        last_id = model.objects.aggregate(Max('id'))['id__max'] or 0
+
+        updated = 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, {'scale': SCALES[STELLAR_DIVISIBILITY], 'divisibility': STELLAR_DIVISIBILITY,
+                                     'start': start, 'end': start + batch_size, 'max_units': MAX_UNITS})
+                updated += cursor.rowcount
+
+        # Amounts too large for their units are left without them:
+        logger.info('Backfilled %s %s rows.' % (updated, table))
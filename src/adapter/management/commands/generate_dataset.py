@@ -0,0 +1,245 @@
+import bisect
+import csv
+import io
+import json
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from logging import getLogger
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from adapter.amounts import STELLAR_DIVISIBILITY, to_units
+from adapter.cache import asset_registry
+from adapter.models import STORE_AMOUNT_UNITS, AdminAccount, ReceiveTransaction, SendTransaction, UserAccount
+
+logger = getLogger('django')
+
+# Written for NULL values, as csv would otherwise write them as empty strings:
+NULL = '\\N'
+
+ADDRESS_CHARACTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+
+
+class WeightedChoice:
+    """
+    Picks values from a "value:weight,value:weight" specification.
+    """
+
+    def __init__(self, spec):
+        self.values = []
+        self.cumulative = []
+        total = 0
+        for entry in spec.split(','):
+            value, sep, weight = entry.strip().partition(':')
+            try:
+                total += float(weight) if sep else 1.0
+            except ValueError:
+                raise CommandError('Invalid weight in "%s".' % (spec,))
+            self.values.append(value)
+            self.cumulative.append(total)
+
+        if not total:
+            raise CommandError('Weights in "%s" must not all be zero.' % (spec,))
+
+    def pick(self, rng):
+        return self.values[bisect.bisect_right(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+class Command(BaseCommand):
+    help = ('Generates reproducible synthetic user accounts and receive and send transactions, '
+            'loaded with COPY, for benchmarking queries and indexes at production scale.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', dest='seed', type=int, default=0,
+                            help='Seed for all generated values.')
+        parser.add_argument('--prefix', dest='prefix', default='dataset',
+                            help='Prefix of generated unique identifiers. Use a new prefix to add to existing data.')
+        parser.add_argument('--users', dest='users', type=int, default=100000,
+                            help='Number of user accounts.')
+        parser.add_argument('--receives', dest='receives', type=int, default=1000000,
+                            help='Number of receive transactions.')
+        parser.add_argument('--sends', dest='sends', type=int, default=1000000,
+                            help='Number of send transactions.')
+        parser.add_argument('--assets', dest='assets', default='XLM:80,USD:15,EUR:5',
+                            help='Asset codes and their weights. Assets other than XLM get a generated issuer.')
+        parser.add_argument('--receive-statuses', dest='receive_statuses',
+                            default='Complete:94,Confirmed:2,Pending:2,Failed:2',
+                            help='Receive transaction statuses and their weights.')
+        parser.add_argument('--send-statuses', dest='send_statuses',
+                            default='Complete:94,Confirmed:2,Pending:2,Failed:2',
+                            help='Send transaction statuses and their weights.')
+        parser.add_argument('--payload-bytes', dest='payload_bytes', type=int, default=0,
+                            help='Approximate size of each transaction\'s data payload. 0 leaves it empty.')
+        parser.add_argument('--days', dest='days', type=int, default=365,
+                            help='Number of days that creation times are spread over.')
+        parser.add_argument('--end', dest='end', default=None,
+                            help='Date (YYYY-MM-DD) of the newest transactions. Defaults to today.')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=100000,
+                            help='Number of rows loaded per COPY.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('generate_dataset requires PostgreSQL.')
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.chunk_size = options['chunk_size']
+        self.payload_bytes = options['payload_bytes']
+
+        end = datetime.strptime(options['end'], '%Y-%m-%d') if options['end'] else datetime.utcnow()
+        self.end = timezone.make_aware(end.replace(hour=0, minute=0, second=0, microsecond=0), timezone.utc)
+        self.span = timedelta(days=options['days'])
+
+        account = self._admin_account()
+        assets = self._assets(options['assets'])
+
+        self._copy(UserAccount, ('rehive_id', 'account_id', 'admin_account', 'metadata'),
+                   self._user_rows(account, options['users']))
+        users = list(UserAccount.objects.filter(rehive_id__startswith=self.prefix + '-user-')
+                     .order_by('id').values_list('id', 'rehive_id', 'account_id'))
+        if options['receives'] and not users:
+            raise CommandError('Receive transactions require at least one user account.')
+
+        self._copy(ReceiveTransaction,
+                   ('admin_account', 'user_account', 'external_id', 'transaction_hash', 'rehive_code', 'recipient',
+                    'amount', 'amount_units', 'amount_divisibility', 'asset', 'issuer', 'rehive_response', 'status',
+                    'paging_token', 'ledger', 'source_account', 'memo', 'ledger_created', 'data', 'metadata',
+                    'created'),
+                   self._receive_rows(account, users, assets, WeightedChoice(options['receive_statuses']),
+                                      options['receives']))
+        self._copy(SendTransaction,
+                   ('admin_account', 'external_id', 'rehive_code', 'recipient', 'amount', 'amount_units',
+                    'amount_divisibility', 'asset', 'issuer', 'rehive_request', 'rehive_response', 'status', 'data',
+                    'metadata', 'created'),
+                   self._send_rows(account, assets, WeightedChoice(options['send_statuses']), options['sends']))
+
+        # Refresh planner statistics so benchmarks do not run against an empty-table plan:
+        with connection.cursor() as cursor:
+            for model in (UserAccount, ReceiveTransaction, SendTransaction):
+                cursor.execute('ANALYZE %s' % (connection.ops.quote_name(model._meta.db_table),))
+
+    def _admin_account(self):
+        # Always drawn, so the generated rows do not depend on whether the account exists:
+        address = self._address()
+        account = AdminAccount.objects.filter(default=True).first()
+        if account is None:
+            account = AdminAccount.objects.create(name='receive', default=True, account_id=address)
+        return account
+
+    def _assets(self, spec) -> tuple:
+        choice = WeightedChoice(spec)
+        assets = {}
+        for code in choice.values:
+            if code == 'XLM':
+                assets[code] = asset_registry.get_or_create(code='XLM', divisibility=7)
+            else:
+                assets[code] = asset_registry.get_or_create(code=code, account_id=self._address(),
+                                                            issuer=code.lower() + '.example.com', divisibility=7)
+        return choice, assets
+
+    def _address(self):
+        return 'G' + ''.join(self.rng.choice(ADDRESS_CHARACTERS) for i in range(55))
+
+    def _hash(self):
+        return '%064x' % (self.rng.getrandbits(256),)
+
+    def _amount(self):
+        # Log-uniform amounts with 7 decimal places, as on Stellar:
+        return Decimal(10 ** self.rng.uniform(-2, 5)).quantize(Decimal('0.0000001'))
+
+    @staticmethod
+    def _units(amount):
+        # Only stored in the integer amount storage mode, as for transactions saved by the adapter:
+        return to_units(amount, STELLAR_DIVISIBILITY) if STORE_AMOUNT_UNITS else None
+
+    def _created(self, index, count):
+        # Evenly spread over the period in id order, so ids and creation times increase together:
+        return self.end - self.span + self.span * (index + 1) / count
+
+    def _payload(self, **fields):
+        if not self.payload_bytes:
+            return {}
+        payload = dict(fields)
+        padding = self.payload_bytes - len(json.dumps(payload))
+        if padding > 0:
+            payload['padding'] = 'x' * padding
+        return payload
+
+    def _user_rows(self, account, count):
+        for i in range(count):
+            yield ('%s-user-%s' % (self.prefix, i), '%s%s*rehive.com' % (self.prefix, i), account.id, {})
+
+    def _receive_rows(self, account, users, assets, statuses, count):
+        choice, assets = assets
+        for i in range(count):
+            user_id, rehive_id, account_id = self.rng.choice(users)
+            asset = assets[choice.pick(self.rng)]
+            status = statuses.pick(self.rng)
+            tx_hash = self._hash()
+            created = self._created(i, count)
+            amount = self._amount()
+            memo = account_id.split('*')[0]
+            # Payments are identified by their operation id, which is also their paging token:
+            paging_token = (i + 1) << 12
+            yield (account.id, user_id, '%s-%s' % (self.prefix, paging_token), tx_hash,
+                   '%s-receive-%s' % (self.prefix, i) if status in ('Pending', 'Confirmed', 'Complete') else None,
+                   rehive_id, amount, self._units(amount), STELLAR_DIVISIBILITY, asset.id, asset.issuer or '',
+                   {'status': 'success'} if status == 'Complete' else {}, status,
+                   paging_token, i // 10 + 1, self._address(), memo, created,
+                   self._payload(type='payment', id=str(paging_token), transaction_hash=tx_hash,
+                                 to=account.account_id, amount=str(amount), asset_code=asset.code),
+                   {'type': 'stellar'}, created)
+
+    def _send_rows(self, account, assets, statuses, count):
+        choice, assets = assets
+        for i in range(count):
+            asset = assets[choice.pick(self.rng)]
+            status = statuses.pick(self.rng)
+            recipient = self._address()
+            amount = self._amount()
+            sent = status in ('Confirmed', 'Complete')
+            tx_hash = self._hash() if sent else None
+            yield (account.id, tx_hash, '%s-send-%s' % (self.prefix, i), recipient, amount, self._units(amount),
+                   STELLAR_DIVISIBILITY, asset.id, asset.issuer or '', {},
+                   {'status': 'success'} if status == 'Complete' else {}, status,
+                   self._payload(hash=tx_hash, recipient=recipient, amount=str(amount), asset_code=asset.code),
+                   {}, self._created(i, count))
+
+    def _copy(self, model, fields, rows):
+        """
+        Loads rows of field values into the model's table with COPY, one transaction per chunk.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+        sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL \'%s\')' % (table, columns, NULL)
+
+        loaded = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                loaded += self._copy_chunk(sql, chunk)
+                chunk = []
+        if chunk:
+            loaded += self._copy_chunk(sql, chunk)
+
+        logger.info('Loaded %s %s rows.' % (loaded, model._meta.model_name))
+
+    @staticmethod
+    def _copy_chunk(sql, chunk) -> int:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in chunk:
+            writer.writerow([NULL if value is None else
+                             json.dumps(value) if isinstance(value, dict) else
+                             value.isoformat() if isinstance(value, datetime) else
+                             value for value in row])
+        buffer.seek(0)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+
+        return len(chunk)
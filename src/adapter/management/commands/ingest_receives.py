@@ -0,0 +1,57 @@
+import time
+from logging import getLogger
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from adapter.models import AdminAccount
+
+logger = getLogger('django')
+
+
+class Command(BaseCommand):
+    help = 'Ingests Stellar payments received by an admin account, resuming from its persisted cursor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', dest='account', default=None,
+                            help='Name of the admin account to ingest for. Defaults to the default account.')
+        parser.add_argument('--follow', dest='follow', action='store_true', default=False,
+                            help='Keep following the account for new payments.')
+        parser.add_argument('--interval', dest='interval', type=float, default=5.0,
+                            help='Seconds to wait between polls once ingestion has caught up.')
+        parser.add_argument('--max-backoff', dest='max_backoff', type=float, default=300.0,
+                            help='Most seconds to wait before retrying after consecutive errors.')
+
+    def handle(self, *args, **options):
+        if options['account']:
+            account = AdminAccount.objects.get(name=options['account'])
+        else:
+            account = AdminAccount.objects.get(default=True)
+
+        errors = 0
+        while True:
+            try:
+                # Reload the cursor in case another process advanced it:
+                account.refresh_from_db()
+                processed = account.process_receives()
+            except Exception:
+                if not options['follow']:
+                    raise
+
+                # Pages are committed one at a time, so ingestion resumes from the last stored page:
+                errors += 1
+                backoff = min(options['interval'] * 2 ** (errors - 1), options['max_backoff'])
+                logger.exception('Receive ingestion failed, retrying in %s seconds.' % (backoff,))
+                close_old_connections()
+                time.sleep(backoff)
+                continue
+
+            errors = 0
+            logger.info('Ingested %s receive transactions.' % (processed,))
+
+            if not options['follow']:
+                break
+
+            # Poll again immediately while there is a backlog:
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from adapter.benchmarks.scenarios import Benchmark
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks receive ingestion, send submission and Rehive confirmation against local Horizon '
+            'and Rehive stand-ins, in a test database that is created for the run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--receives', dest='receives', type=int, default=1000,
+                            help='Number of payments to ingest.')
+        parser.add_argument('--sends', dest='sends', type=int, default=1000,
+                            help='Number of sends to submit.')
+        parser.add_argument('--confirmations', dest='confirmations', type=int, default=1000,
+                            help='Number of additional sent transactions to confirm on Rehive.')
+        parser.add_argument('--users', dest='users', type=int, default=100,
+                            help='Number of user accounts that payments are spread over.')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=100,
+                            help='Number of items processed per round.')
+        parser.add_argument('--horizon-latency', dest='horizon_latency', type=float, default=0.0,
+                            help='Seconds added to every Horizon response.')
+        parser.add_argument('--rehive-latency', dest='rehive_latency', type=float, default=0.0,
+                            help='Seconds added to every Rehive response.')
+        parser.add_argument('--error-rate', dest='error_rate', type=float, default=0.0,
+                            help='Fraction of Horizon submissions and Rehive requests that fail.')
+        parser.add_argument('--seed', dest='seed', type=int, default=0,
+                            help='Seed for generated accounts, payments and errors.')
+        parser.add_argument('--keepdb', dest='keepdb', action='store_true', default=False,
+                            help='Reuse and keep the test database.')
+        parser.add_argument('--json', dest='json', action='store_true', default=False,
+                            help='Print results as JSON lines.')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+
+        benchmark = Benchmark(users=options['users'],
+                              batch_size=options['batch_size'],
+                              horizon_latency=options['horizon_latency'],
+                              rehive_latency=options['rehive_latency'],
+                              error_rate=options['error_rate'],
+                              seed=options['seed'])
+        try:
+            benchmark.setup()
+            results = [benchmark.receives(options['receives']),
+                       benchmark.sends(options['sends']),
+                       benchmark.confirmations(options['confirmations'])]
+        finally:
+            benchmark.teardown()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        for result in results:
+            if options['json']:
+                self.stdout.write(json.dumps(result))
+            else:
+                self.stdout.write('%(scenario)-14s %(items)7d items  %(seconds)8.2fs  %(throughput)9.1f/s  '
+                                  'p50 %(p50).4fs  p99 %(p99).4fs  %(queries)6d queries  %(requests)6d requests  '
+                                  '%(peak_memory_kb)7d KiB' % result)
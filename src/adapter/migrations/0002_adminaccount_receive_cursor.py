@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adminaccount',
+            name='receive_cursor',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
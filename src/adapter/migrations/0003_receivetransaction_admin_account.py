@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0002_adminaccount_receive_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='admin_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='adapter.AdminAccount'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='receivetransaction',
+            unique_together=set([('external_id', 'admin_account')]),
+        ),
+    ]
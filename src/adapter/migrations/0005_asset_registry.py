@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0004_useraccount_account_id_index'),
+    ]
+
+    operations = [
+        # Bring the migration state in line with the Currency -> Asset rename in the models:
+        migrations.RenameModel(
+            old_name='Currency',
+            new_name='Asset',
+        ),
+        migrations.AlterField(
+            model_name='asset',
+            name='code',
+            field=models.CharField(blank=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='issuer',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='account_id',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='metadata',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default={}),
+        ),
+        migrations.RenameField(
+            model_name='receivetransaction',
+            old_name='currency',
+            new_name='asset',
+        ),
+        migrations.RenameField(
+            model_name='sendtransaction',
+            old_name='currency',
+            new_name='asset',
+        ),
+        migrations.AlterUniqueTogether(
+            name='asset',
+            unique_together=set([('code', 'account_id')]),
+        ),
+    ]
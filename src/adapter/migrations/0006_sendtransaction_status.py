@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0005_asset_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendtransaction',
+            name='rehive_response',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default={}, null=True),
+        ),
+        # Sends made before statuses were tracked were already submitted and reported, so they are
+        # left without a status instead of being picked up again as pending:
+        migrations.AddField(
+            model_name='sendtransaction',
+            name='status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Complete', 'Complete'), ('Failed', 'Failed')], db_index=True, max_length=24, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sendtransaction',
+            name='status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Complete', 'Complete'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=24, null=True),
+        ),
+    ]
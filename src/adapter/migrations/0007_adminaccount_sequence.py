@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0006_sendtransaction_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adminaccount',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
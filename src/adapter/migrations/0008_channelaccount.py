@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0007_adminaccount_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelAccount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('secret', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default={}, null=True)),
+                ('sequence', models.BigIntegerField(blank=True, null=True)),
+                ('leased_until', models.DateTimeField(blank=True, null=True)),
+                ('admin_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='channels', to='adapter.AdminAccount')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0008_channelaccount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sendtransaction',
+            name='rehive_code',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
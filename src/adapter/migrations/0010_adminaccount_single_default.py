@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0009_sendtransaction_rehive_code_unique'),
+    ]
+
+    operations = [
+        # Only one admin account may be the default:
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX adapter_adminaccount_single_default ON adapter_adminaccount ("default") '
+            'WHERE "default";',
+            'DROP INDEX adapter_adminaccount_single_default;'
+        ),
+    ]
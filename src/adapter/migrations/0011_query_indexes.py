@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0010_adminaccount_single_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useraccount',
+            name='account_id',
+            field=models.CharField(blank=True, max_length=200, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='rehive_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterModelOptions(
+            name='receivetransaction',
+            options={'get_latest_by': 'id'},
+        ),
+        migrations.AlterModelOptions(
+            name='sendtransaction',
+            options={'get_latest_by': 'id'},
+        ),
+        migrations.AlterIndexTogether(
+            name='receivetransaction',
+            index_together=set([('admin_account', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='sendtransaction',
+            index_together=set([('admin_account', 'status')]),
+        ),
+    ]
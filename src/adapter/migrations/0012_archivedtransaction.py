@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='sendtransaction',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tx_type', models.CharField(choices=[('send', 'Send'), ('receive', 'Receive')], max_length=24)),
+                ('original_id', models.IntegerField()),
+                ('external_id', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('rehive_code', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('created', models.DateTimeField(db_index=True)),
+                ('archived', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default={}, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0012_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='paging_token',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='ledger',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='source_account',
+            field=models.CharField(blank=True, max_length=56, null=True),
+        ),
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='memo',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='ledger_created',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Promote the fields of previously stored payloads and drop their links:
+        migrations.RunSQL(
+            "UPDATE adapter_receivetransaction "
+            "SET paging_token = (data->>'paging_token')::bigint, "
+            "source_account = data->>'from', "
+            "ledger_created = (data->>'created_at')::timestamptz, "
+            "data = data - '_links' "
+            "WHERE data ? 'paging_token';",
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0013_receivetransaction_payment_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adminaccount',
+            name='account_id',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='adminaccount',
+            name='network',
+            field=models.CharField(default='TESTNET', max_length=20),
+        ),
+    ]
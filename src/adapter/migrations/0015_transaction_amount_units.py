@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0014_adminaccount_account_id_network'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='amount_units',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='receivetransaction',
+            name='amount_divisibility',
+            field=models.PositiveSmallIntegerField(default=7),
+        ),
+        migrations.AddField(
+            model_name='sendtransaction',
+            name='amount_units',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sendtransaction',
+            name='amount_divisibility',
+            field=models.PositiveSmallIntegerField(default=7),
+        ),
+    ]
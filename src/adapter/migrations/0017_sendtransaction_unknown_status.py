@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0016_receivetransaction_transaction_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sendtransaction',
+            name='status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Unknown', 'Unknown'), ('Confirmed', 'Confirmed'), ('Complete', 'Complete'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=24, null=True),
+        ),
+    ]
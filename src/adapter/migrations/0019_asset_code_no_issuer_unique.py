@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adapter', '0018_archivedtransaction_admin_account'),
+    ]
+
+    operations = [
+        # Merge assets without an issuer that were duplicated into the first one created:
+        migrations.RunSQL(
+            'UPDATE adapter_receivetransaction t SET asset_id = a.keep_id '
+            'FROM (SELECT id, MIN(id) OVER (PARTITION BY code) AS keep_id FROM adapter_asset '
+            'WHERE account_id IS NULL) a WHERE t.asset_id = a.id AND a.id <> a.keep_id;'
+            'UPDATE adapter_sendtransaction t SET asset_id = a.keep_id '
+            'FROM (SELECT id, MIN(id) OVER (PARTITION BY code) AS keep_id FROM adapter_asset '
+            'WHERE account_id IS NULL) a WHERE t.asset_id = a.id AND a.id <> a.keep_id;'
+            'DELETE FROM adapter_asset a USING adapter_asset b '
+            'WHERE a.account_id IS NULL AND b.account_id IS NULL AND a.code = b.code AND a.id > b.id;',
+            migrations.RunSQL.noop
+        ),
+        # unique_together does not apply to rows without an issuer, as NULLs are never equal:
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX adapter_asset_code_no_issuer ON adapter_asset (code) '
+            'WHERE account_id IS NULL;',
+            'DROP INDEX adapter_asset_code_no_issuer;'
+        ),
+    ]
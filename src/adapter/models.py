@@ -2,12 +2,22 @@ from logging import getLogger
 
 from decimal import Decimal
 from django.contrib.postgres.fields import JSONField
-from django.db import models
-from django.db.models.signals import post_save
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from .amounts import STELLAR_DIVISIBILITY, from_units, to_units
+
 logger = getLogger('django')
 
+# Whether transaction amounts are also stored as integer base units:
+STORE_AMOUNT_UNITS = getattr(settings, 'ADAPTER_STORE_AMOUNT_UNITS', False)
+
 
 class MoneyField(models.DecimalField):
     """Decimal Field with hardcoded precision of 28 and a scale of 18."""
@@ -27,9 +37,102 @@ class Asset(models.Model):
     divisibility = models.IntegerField(default=2)
     metadata = JSONField(null=False, blank=True, default={})
 
+    class Meta:
+        # Codes without an issuer are kept unique by a partial index (migration 0019):
+        unique_together = (('code', 'account_id'),)
+
+
+class AmountQuerySet(models.QuerySet):
+    def total_amount(self) -> Decimal:
+        """
+        Sums the amounts of the transactions, using the integer base units wherever they are stored.
+        """
+        total = self.filter(amount_units=None).aggregate(total=Sum('amount'))['total'] or Decimal(0)
+        for row in (self.exclude(amount_units=None).order_by()
+                    .values('amount_divisibility').annotate(units=Sum('amount_units'))):
+            total += from_units(row['units'], row['amount_divisibility'])
+        return total
+
+
+class AmountUnitsMixin:
+    """
+    Keeps the integer base units of a transaction amount when ADAPTER_STORE_AMOUNT_UNITS is set,
+    or when they were stored before.
+    """
+
+    def set_amount_units(self, units=None):
+        if STORE_AMOUNT_UNITS or self.amount_units is not None:
+            self.amount_units = to_units(self.amount, STELLAR_DIVISIBILITY) if units is None else units
+            self.amount_divisibility = STELLAR_DIVISIBILITY
+
+    def get_amount(self) -> Decimal:
+        if self.amount_units is None:
+            return self.amount
+        return from_units(self.amount_units, self.amount_divisibility)
+
+
+class ReceiveTransactionManager(models.Manager.from_queryset(AmountQuerySet)):
+    def bulk_ingest(self, transactions) -> list:
+        """
+        Inserts a batch of unsaved receive transactions in a single query.
+        Transactions already logged or archived with the same external_id for the admin account are skipped.
+        Returns the ids of the newly created transactions.
+        """
+        if not transactions:
+            return []
+
+        # Archived receives are no longer in the table, so skip them explicitly:
+        archived = set(ArchivedTransaction.objects
+                       .filter(tx_type='receive',
+                               admin_account__in={tx.admin_account_id for tx in transactions},
+                               external_id__in=[tx.external_id for tx in transactions])
+                       .values_list('admin_account_id', 'external_id'))
+        transactions = [tx for tx in transactions if (tx.admin_account_id, tx.external_id) not in archived]
+        if not transactions:
+            return []
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        fields = [field for field in opts.concrete_fields if not isinstance(field, models.AutoField)]
+
+        values = []
+        params = []
+        for tx in transactions:
+            values.append('(%s)' % ', '.join(['%s'] * len(fields)))
+            params.extend(field.get_db_prep_save(field.pre_save(tx, True), connection) for field in fields)
+
+        sql = 'INSERT INTO %s (%s) VALUES %s ON CONFLICT (%s, %s) DO NOTHING RETURNING %s' % (
+            qn(opts.db_table),
+            ', '.join(qn(field.column) for field in fields),
+            ', '.join(values),
+            qn(opts.get_field('external_id').column),
+            qn(opts.get_field('admin_account').column),
+            qn(opts.pk.column))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def upload_to_rehive(self, tx_ids):
+        from .rehive_api import create_or_confirm_rehive_receive, create_rehive_receives
+        """
+        Creates and confirms newly ingested transactions on Rehive.
+        In batching mode a single task creates them all, and they are confirmed in the next batch.
+        """
+        if not tx_ids:
+            return
+
+        if getattr(settings, 'REHIVE_CONFIRM_BATCHING', False):
+            create_rehive_receives.delay(list(tx_ids))
+            return
+
+        for tx_id in tx_ids:
+            create_or_confirm_rehive_receive.delay(tx_id, confirm=True)
+
 
 # Log of all receive transactions processed.
-class ReceiveTransaction(models.Model):
+class ReceiveTransaction(AmountUnitsMixin, models.Model):
     STATUS = (
         ('Waiting', 'Waiting'),
         ('Pending', 'Pending'),
@@ -37,17 +140,40 @@ class ReceiveTransaction(models.Model):
         ('Complete', 'Complete'),  # Confirmed and uploaded to rehive
         ('Failed', 'Failed'),
     )
+    admin_account = models.ForeignKey('adapter.AdminAccount', null=True, blank=True)
     user_account = models.ForeignKey('adapter.UserAccount')
+    # Horizon id of the payment operation, as a transaction can contain several payments.
+    # Receives ingested before this held the transaction hash instead:
     external_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    transaction_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     rehive_code = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     recipient = models.CharField(max_length=200, null=True, blank=True)
     amount = MoneyField(default=Decimal(0))
+    amount_units = models.BigIntegerField(null=True, blank=True)  # amount in base units, if stored
+    amount_divisibility = models.PositiveSmallIntegerField(default=STELLAR_DIVISIBILITY)
     asset = models.ForeignKey('adapter.Asset')
     issuer = models.CharField(max_length=200, null=True, blank=True)
     rehive_response = JSONField(null=True, blank=True, default={})
     status = models.CharField(max_length=24, choices=STATUS, null=True, blank=True, db_index=True)
-    data = JSONField(null=True, blank=True, default={})
+    paging_token = models.BigIntegerField(null=True, blank=True, db_index=True)  # Horizon cursor of the payment
+    ledger = models.IntegerField(null=True, blank=True)
+    source_account = models.CharField(max_length=56, null=True, blank=True)
+    memo = models.CharField(max_length=64, null=True, blank=True)
+    ledger_created = models.DateTimeField(null=True, blank=True)  # close time of the payment's ledger
+    data = JSONField(null=True, blank=True, default={})  # raw Horizon payload, if stored
     metadata = JSONField(null=True, blank=True, default={})
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = ReceiveTransactionManager()
+
+    class Meta:
+        get_latest_by = 'id'
+        unique_together = (('external_id', 'admin_account'),)
+        index_together = (('admin_account', 'id'),)
+
+    def save(self, *args, **kwargs):
+        self.set_amount_units()
+        return super(ReceiveTransaction, self).save(*args, **kwargs)
 
     def upload_to_rehive(self):
         from .rehive_api import create_or_confirm_rehive_receive
@@ -61,10 +187,13 @@ class ReceiveTransaction(models.Model):
 
 
 # Log of all processed sends.
-class SendTransaction(models.Model):
+class SendTransaction(AmountUnitsMixin, models.Model):
     STATUS = (
         ('Pending', 'Pending'),
-        ('Complete', 'Complete'),
+        ('Unknown', 'Unknown'),  # Submitted, but not yet known to be on the ledger
+        ('Confirmed', 'Confirmed'),  # Sent but not yet confirmed on rehive
+        ('Complete', 'Complete'),  # Sent and confirmed on rehive
+        ('Failed', 'Failed'),
     )
     TYPE = (
         ('send', 'Send'),
@@ -72,45 +201,73 @@ class SendTransaction(models.Model):
     )
     admin_account = models.ForeignKey('adapter.AdminAccount')
     external_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
-    rehive_code = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    rehive_code = models.CharField(max_length=100, null=True, blank=True, unique=True)
     recipient = models.CharField(max_length=200, null=True, blank=True)
     amount = MoneyField(default=Decimal(0))
+    amount_units = models.BigIntegerField(null=True, blank=True)  # amount in base units, if stored
+    amount_divisibility = models.PositiveSmallIntegerField(default=STELLAR_DIVISIBILITY)
     asset = models.ForeignKey('adapter.Asset')
     issuer = models.CharField(max_length=200, null=True, blank=True)
     rehive_request = JSONField(null=True, blank=True, default={})
+    rehive_response = JSONField(null=True, blank=True, default={})
+    status = models.CharField(max_length=24, choices=STATUS, null=True, blank=True, db_index=True, default='Pending')
     data = JSONField(null=True, blank=True, default={})
     metadata = JSONField(null=True, blank=True, default={})
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = models.Manager.from_queryset(AmountQuerySet)()
+
+    class Meta:
+        get_latest_by = 'id'
+        index_together = (('admin_account', 'status'),)
 
     def save(self, *args, **kwargs):
         if not self.id:  # On create
-            self.admin_account = AdminAccount.objects.get(default=True)
+            self.admin_account = AdminAccount.objects.get_default()
+        self.set_amount_units()
         return super(SendTransaction, self).save(*args, **kwargs)
 
-    def execute(self):
-        self.admin_account.send(self)
+    def execute(self) -> bool:
+        return self.admin_account.send(self)
+
+
+# Cold storage for completed transactions moved out of the transaction tables by the archive_transactions command.
+class ArchivedTransaction(models.Model):
+    TYPE = (
+        ('send', 'Send'),
+        ('receive', 'Receive'),
+    )
+    tx_type = models.CharField(max_length=24, choices=TYPE)
+    original_id = models.IntegerField()
+    admin_account = models.ForeignKey('adapter.AdminAccount', null=True, blank=True)
+    external_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    rehive_code = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    created = models.DateTimeField(db_index=True)
+    archived = models.DateTimeField(default=timezone.now)
+    data = JSONField(null=True, blank=True, default={})  # all fields of the original transaction
 
 
 # Accounts for identifying Rehive users.
 # Passive account, receive only.
 class UserAccount(models.Model):
-    rehive_id = models.CharField(max_length=100, null=True, blank=True)  # id for identifying user on rehive
-    account_id = models.CharField(max_length=200, null=True, blank=True)  # crypto address
+    rehive_id = models.CharField(max_length=100, null=True, blank=True, unique=True)  # id for identifying user on rehive
+    account_id = models.CharField(max_length=200, null=True, blank=True, unique=True)  # crypto address
     admin_account = models.ForeignKey('adapter.AdminAccount')
     metadata = JSONField(null=True, blank=True, default={})
 
     def save(self, *args, **kwargs):
         if not self.id:  # On create
             logger.info('Fetching account_id.')
-            self.admin_account = AdminAccount.objects.get(name='receive')
+            self.admin_account = AdminAccount.objects.get_by_name('receive')
             self._new_account()
         return super(UserAccount, self).save(*args, **kwargs)
 
     def _new_account(self):
-        from .api import Interface
-        interface = Interface(account=self.admin_account)
+        from .api import get_interface
+        interface = get_interface(self.admin_account)
 
         # Get and save user account ID:
-        account_details = interface.get_user_account_details()
+        account_details = interface.get_user_account_details(metadata=self.metadata)
         self.account_id = account_details['account_id']
         self.metadata = account_details['details']
 
@@ -137,41 +294,151 @@ def subscribe_to_receive_hooks(sender, instance, created, **kwargs):
             pass
 
 
+@receiver(post_save, sender=Asset, dispatch_uid="invalidate_saved_asset")
+@receiver(post_delete, sender=Asset, dispatch_uid="invalidate_deleted_asset")
+def invalidate_asset_registry(sender, **kwargs):
+    from .cache import asset_registry
+    asset_registry.invalidate()
+
+
+@receiver(post_save, sender=UserAccount, dispatch_uid="invalidate_saved_user_account")
+@receiver(post_delete, sender=UserAccount, dispatch_uid="invalidate_deleted_user_account")
+def invalidate_user_account(sender, instance, **kwargs):
+    from .cache import user_account_cache
+    from .stellar_federation import invalidate_address
+    user_account_cache.delete(instance.account_id)
+    invalidate_address(instance.account_id)
+
+
+class AdminAccountManager(models.Manager):
+    def get_default(self):
+        """
+        Returns the default admin account, cached per process.
+        """
+        return self._get_cached('default', default=True)
+
+    def get_by_name(self, name):
+        """
+        Returns the admin account with the given name, cached per process.
+        """
+        return self._get_cached('name:' + name, name=name)
+
+    def _get_cached(self, key, **lookup):
+        from .cache import admin_account_cache
+        return admin_account_cache.get_or_load(key, lambda: self.get(**lookup))
+
+
 # HotWallet/ Operational Accounts for sending or receiving on behalf of users.
 # Admin accounts usually have a secret key to authenticate with third-party provider (or XPUB for key generation).
 class AdminAccount(models.Model):
     name = models.CharField(max_length=100, null=True, blank=True)
     rehive_id = models.CharField(max_length=100, null=True, blank=True)  # id for identifying admin on rehive
     type = models.CharField(max_length=100, null=True, blank=True)  # some more descriptive info.
+    account_id = models.CharField(max_length=200, null=True, blank=True)  # crypto address
+    network = models.CharField(max_length=20, default='TESTNET')  # stellar network name
     secret = JSONField(null=True, blank=True, default={})  # crypto seed, private key or XPUB
     metadata = JSONField(null=True, blank=True, default={})
     default = models.BooleanField(default=False)
+    receive_cursor = models.CharField(max_length=100, null=True, blank=True)  # paging token of last ingested payment
+    sequence = models.BigIntegerField(null=True, blank=True)  # last used sequence number, fetched if unknown
+
+    objects = AdminAccountManager()
 
     def send(self, tx: SendTransaction) -> bool:
-        from .api import Interface
-        from .rehive_api import confirm_rehive_transaction
+        from .api import get_interface
         """
         Initiates a send transaction using the Admin account.
         """
-        interface = Interface(account=self)
-        interface.send(tx)
-        confirm_rehive_transaction(tx_id=tx.id, tx_type='send')
-        return True
+        interface = get_interface(self)
+        return interface.send(tx)
 
     # Return account id (e.g. Bitcoin address)
     def get_account_details(self) -> dict:
-        from .api import Interface
+        from .api import get_interface
         """
         Returns third party identifier of Admin account. E.g. Bitcoin address.
         """
-        interface = Interface(account=self)
+        interface = get_interface(self)
         return interface.get_account_details()
 
     def get_balance(self) -> int:
-        from .api import Interface
-        interface = Interface(account=self)
+        from .api import get_interface
+        interface = get_interface(self)
         return interface.get_account_balance()
 
+    def process_receives(self) -> int:
+        from .api import get_interface
+        """
+        Ingests all payments received since the stored cursor.
+        """
+        interface = get_interface(self)
+        return interface.process_receives()
+
+
+class ChannelAccountManager(models.Manager):
+    def lease(self, admin_account, duration=None):
+        """
+        Leases a free channel account of the admin account, or returns None if none are free.
+        Leases expire after `duration` seconds in case a worker dies without releasing its channel.
+        """
+        from django.conf import settings
+        duration = duration or getattr(settings, 'STELLAR_CHANNEL_LEASE_SECONDS', 60)
+        now = timezone.now()
+
+        free = (self.filter(admin_account=admin_account)
+                .filter(Q(leased_until=None) | Q(leased_until__lt=now))
+                .order_by('id'))
+        for channel in free[:10]:
+            # Only take the lease if no other worker took it since the channel was read:
+            leased_until = now + timedelta(seconds=duration)
+            if self.filter(id=channel.id, leased_until=channel.leased_until).update(leased_until=leased_until):
+                channel.leased_until = leased_until
+                return channel
+
+        return None
+
+    def renew(self, channel, duration=None) -> bool:
+        """
+        Extends a channel's lease by `duration` seconds from now.
+        Returns False if the lease expired and was taken by another worker in the meantime.
+        """
+        from django.conf import settings
+        duration = duration or getattr(settings, 'STELLAR_CHANNEL_LEASE_SECONDS', 60)
+        leased_until = timezone.now() + timedelta(seconds=duration)
+        if not self.filter(id=channel.id, leased_until=channel.leased_until).update(leased_until=leased_until):
+            return False
+        channel.leased_until = leased_until
+        return True
+
+    def release(self, channel):
+        self.filter(id=channel.id).update(leased_until=None)
+        channel.leased_until = None
+
+
+# Channel accounts used as the source of send transactions on behalf of an Admin account.
+# Each channel has its own sequence number, so sends through different channels can be in flight at once.
+class ChannelAccount(models.Model):
+    admin_account = models.ForeignKey('adapter.AdminAccount', related_name='channels')
+    account_id = models.CharField(max_length=200, null=True, blank=True)  # crypto address
+    secret = JSONField(null=True, blank=True, default={})  # crypto seed
+    sequence = models.BigIntegerField(null=True, blank=True)  # last used sequence number, fetched if unknown
+    leased_until = models.DateTimeField(null=True, blank=True)
+
+    objects = ChannelAccountManager()
+
+
+@receiver(post_save, sender=AdminAccount, dispatch_uid="invalidate_saved_admin_account")
+@receiver(post_delete, sender=AdminAccount, dispatch_uid="invalidate_deleted_admin_account")
+def invalidate_admin_account(sender, instance, **kwargs):
+    from .api import invalidate_interface
+    from .cache import admin_account_cache
+    # Cursor and sequence updates are made on the cached instances themselves:
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'receive_cursor', 'sequence'}:
+        return
+    admin_account_cache.clear()
+    invalidate_interface(instance.id)
+
 
 class ReceiveWebhook(models.Model):
     webhook_type = models.CharField(max_length=50, null=True, blank=True)
@@ -6,14 +6,18 @@ logger = getLogger('django')
 
 
 # Check that the required secret key matches the secret sent in the authorization headers
-def authenticate(required_secret, request, view):
-    secret = request.META.get('HTTP_AUTHORIZATION')
+def has_secret(required_secret, meta):
+    secret = meta.get('HTTP_AUTHORIZATION')
     if (not secret) or not (('Secret ' + required_secret) == secret):
        return False
 
     return True
 
 
+def authenticate(required_secret, request, view):
+    return has_secret(required_secret, request.META)
+
+
 class AdapterGlobalPermission(permissions.BasePermission):
     def has_permission(self, request, view):
         return authenticate(getattr(settings, 'ADAPTER_SECRET_KEY'), request, view)
@@ -1,45 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from celery import shared_task
 
 import logging
 
 from django.conf import settings
+from django.contrib.postgres.fields import JSONField
+from django.db import connection, models
+from django.db.models import Case, Value, When
 
-from .utils import to_cents
+from .rehive_client import get_client
+from .amounts import to_rehive_units
 from .models import ReceiveTransaction, SendTransaction, UserAccount
 
 from .exceptions import PlatformRequestFailedError
 
 logger = logging.getLogger('django')
 
+# Namespace of the Postgres advisory lock held while confirmations are flushed, apart from the send locks:
+FLUSH_LOCK_NAMESPACE = 2
 
-@shared_task(bind=True, name='adapter.confirm_rehive_tx.task', max_retries=24, default_retry_delay=60 * 60)
-def confirm_rehive_transaction(self, tx_id: int, tx_type: str):
-    if tx_type == 'receive':
-        tx = ReceiveTransaction.objects.get(id=tx_id)
-    elif tx_type == 'send':
-        tx = SendTransaction.objects.get(id=tx_id)
-    else:
-        raise TypeError('Invalid transaction type specified.')
 
-    logger.info('Transaction update request.')
+def _batching_enabled():
+    return getattr(settings, 'REHIVE_CONFIRM_BATCHING', False)
 
-    # Update URL
-    url = getattr(settings, 'REHIVE_API_URL') + '/admins/transactions/update/'
 
-    # Add Authorization headers
-    headers = {'Authorization': 'Token ' + getattr(settings, 'REHIVE_API_TOKEN')}
+def queue_rehive_confirmation(tx, tx_type: str):
+    """
+    Confirms a transaction on Rehive.
+    In batching mode the transaction is left Confirmed for the next flush_rehive_confirmations run.
+    """
+    if not _batching_enabled():
+        confirm_rehive_transaction.delay(tx_id=tx.id, tx_type=tx_type)
+
+
+def _confirm_transaction(task, tx):
+    logger.info('Transaction update request.')
 
     try:
         # Make request
-        r = requests.post(url, json={'tx_code': tx.rehive_code, 'status': 'Confirmed'}, headers=headers)
+        r = get_client().post('/admins/transactions/update/',
+                              {'tx_code': tx.rehive_code, 'status': 'Confirmed'},
+                              idempotent=True)
 
-        if r.status_code in (200,201):
+        if r.status_code in (200, 201):
             tx.rehive_response = r.json()
             tx.status = 'Complete'
             tx.save()
         else:
-            logger.info(headers)
             logger.info('Failed transaction update request: HTTP %s Error: %s' % (r.status_code, r.text))
             tx.rehive_response = {'status': r.status_code, 'data': r.text}
             tx.status = 'Failed'
@@ -48,29 +57,40 @@ def confirm_rehive_transaction(self, tx_id: int, tx_type: str):
     except (requests.exceptions.RequestException, requests.exceptions.MissingSchema) as e:
         try:
             logger.info('Retry transaction update request due to connection error.')
-            self.retry(countdown=5 * 60, exc=PlatformRequestFailedError)
+            task.retry(countdown=5 * 60, exc=PlatformRequestFailedError)
         except PlatformRequestFailedError:
             logger.info('Final transaction update request failure due to connection error.')
 
 
+@shared_task(bind=True, name='adapter.confirm_rehive_tx.task', max_retries=24, default_retry_delay=60 * 60)
+def confirm_rehive_transaction(self, tx_id: int, tx_type: str):
+    if tx_type == 'receive':
+        tx = ReceiveTransaction.objects.get(id=tx_id)
+    elif tx_type == 'send':
+        tx = SendTransaction.objects.get(id=tx_id)
+    else:
+        raise TypeError('Invalid transaction type specified.')
+
+    _confirm_transaction(self, tx)
+
+
+def _receive_data(tx) -> dict:
+    return {'recipient': tx.user_account.rehive_id,
+            'amount': to_rehive_units(tx.get_amount(), tx.asset.code),
+            'currency': tx.asset.code,
+            'issuer': tx.issuer,
+            'metadata': tx.metadata,
+            'from_reference': tx.external_id}
+
+
 @shared_task(bind=True, name='adapter.create_or_confirm_rehive_receive.task', max_retries=24, default_retry_delay=60 * 60)
 def create_or_confirm_rehive_receive(self, tx_id: int, confirm: bool=False):
-    tx = ReceiveTransaction.objects.get(id=tx_id)
+    tx = ReceiveTransaction.objects.select_related('user_account', 'asset').get(id=tx_id)
     # If transaction has not yet been created, create it:
     if not tx.rehive_code:
-        url = getattr(settings, 'REHIVE_API_URL') + '/admins/transactions/receive/'
-        headers = {'Authorization': 'Token ' + getattr(settings, 'REHIVE_API_TOKEN')}
-
         try:
             # Make request:
-            r = requests.post(url,
-                              json={'recipient': tx.user_account.rehive_id,
-                                    'amount': to_cents(tx.amount, 8),
-                                    'currency': tx.currency.code,
-                                    'issuer': tx.issuer,
-                                    'metadata': tx.metadata,
-                                    'from_reference': tx.external_id},
-                              headers=headers)
+            r = get_client().post('/admins/transactions/receive/', _receive_data(tx))
 
             if r.status_code in (200, 201):
                 tx.rehive_response = r.json()
@@ -78,11 +98,11 @@ def create_or_confirm_rehive_receive(self, tx_id: int, confirm: bool=False):
                 tx.status = 'Pending'
                 tx.save()
             else:
-                logger.info(headers)
                 logger.info('Failed transaction update request: HTTP %s Error: %s' % (r.status_code, r.text))
                 tx.status = 'Failed'
                 tx.rehive_response = {'status': r.status_code, 'data': r.text}
                 tx.save()
+                return
 
         except (requests.exceptions.RequestException, requests.exceptions.MissingSchema) as e:
             try:
@@ -90,35 +110,135 @@ def create_or_confirm_rehive_receive(self, tx_id: int, confirm: bool=False):
                 self.retry(countdown=5 * 60, exc=PlatformRequestFailedError)
             except PlatformRequestFailedError:
                 logger.info('Final transaction update request failure due to connection error.')
+            return
 
     # After creation, or if tx already exists, confirm it if necessary
     if confirm:
-        logger.info('Transaction update request.')
-
-        # Update URL
-        url = getattr(settings, 'REHIVE_API_URL') + '/admins/transactions/update/'
+        if _batching_enabled():
+            tx.status = 'Confirmed'
+            tx.save(update_fields=['status'])
+        else:
+            _confirm_transaction(self, tx)
 
-        # Add Authorization headers
-        headers = {'Authorization': 'Token ' + getattr(settings, 'REHIVE_API_TOKEN')}
 
+def _post_receive(tx):
+    try:
+        r = get_client().post('/admins/transactions/receive/', _receive_data(tx))
+    except (requests.exceptions.RequestException, requests.exceptions.MissingSchema):
+        return None
+
+    if r.status_code in (200, 201):
+        response = r.json()
+        # Left for the next flush_rehive_confirmations run:
+        return 'Confirmed', response['data']['tx_code'], response
+    else:
+        logger.info('Failed transaction create request: HTTP %s Error: %s' % (r.status_code, r.text))
+        return 'Failed', None, {'status': r.status_code, 'data': r.text}
+
+
+@shared_task(bind=True, name='adapter.create_rehive_receives.task', max_retries=24, default_retry_delay=60 * 60)
+def create_rehive_receives(self, tx_ids: list):
+    """
+    Creates a page of ingested receives on Rehive concurrently, in batching mode.
+    Created receives are confirmed by flush_rehive_confirmations.
+    """
+    txs = list(ReceiveTransaction.objects.select_related('user_account', 'asset')
+               .filter(id__in=tx_ids, rehive_code=None)
+               .order_by('id'))
+    if not txs:
+        return
+
+    workers = getattr(settings, 'REHIVE_CONFIRM_WORKERS', 10)
+    with ThreadPoolExecutor(max_workers=min(workers, len(txs))) as executor:
+        outcomes = list(executor.map(_post_receive, txs))
+
+    results = {tx.id: outcome for tx, outcome in zip(txs, outcomes) if outcome}
+    if results:
+        ReceiveTransaction.objects.filter(id__in=results.keys()).update(
+            status=Case(*[When(id=tx_id, then=Value(status)) for tx_id, (status, code, response) in results.items()],
+                        output_field=models.CharField()),
+            rehive_code=Case(*[When(id=tx_id, then=Value(code)) for tx_id, (status, code, response) in results.items()],
+                             output_field=models.CharField()),
+            rehive_response=Case(*[When(id=tx_id, then=Value(response, output_field=JSONField()))
+                                   for tx_id, (status, code, response) in results.items()],
+                                 output_field=JSONField()))
+
+    # Retry the receives that could not be sent because of connection errors:
+    remaining = [tx.id for tx, outcome in zip(txs, outcomes) if not outcome]
+    if remaining:
         try:
-            # Make request
-            r = requests.post(url, json={'tx_code': tx.rehive_code, 'status': 'Confirmed'}, headers=headers)
+            logger.info('Retry %s transaction create requests due to connection errors.' % (len(remaining),))
+            self.retry(args=(remaining,), countdown=5 * 60, exc=PlatformRequestFailedError)
+        except PlatformRequestFailedError:
+            logger.info('Final transaction create request failure due to connection error.')
 
-            if r.status_code in (200, 201):
-                tx.rehive_response = r.json()
-                tx.status = 'Complete'
-                tx.save()
-            else:
-                logger.info(headers)
-                logger.info('Failed transaction update request: HTTP %s Error: %s' % (r.status_code, r.text))
-                tx.rehive_response = {'status': r.status_code, 'data': r.text}
-                tx.status = 'Failed'
-                tx.save()
 
-        except (requests.exceptions.RequestException, requests.exceptions.MissingSchema) as e:
-            try:
-                logger.info('Retry transaction update request due to connection error.')
-                self.retry(countdown=5 * 60, exc=PlatformRequestFailedError)
-            except PlatformRequestFailedError:
-                logger.info('Final transaction update request failure due to connection error.')
+def _post_confirmation(tx_code):
+    try:
+        r = get_client().post('/admins/transactions/update/',
+                              {'tx_code': tx_code, 'status': 'Confirmed'},
+                              idempotent=True)
+    except (requests.exceptions.RequestException, requests.exceptions.MissingSchema):
+        return None
+
+    if r.status_code in (200, 201):
+        return 'Complete', r.json()
+    else:
+        logger.info('Failed transaction update request: HTTP %s Error: %s' % (r.status_code, r.text))
+        return 'Failed', {'status': r.status_code, 'data': r.text}
+
+
+def _bulk_update_statuses(model, results: dict):
+    """
+    Updates the status and rehive response of many transactions in a single query.
+    """
+    model.objects.filter(id__in=results.keys()).update(
+        status=Case(*[When(id=tx_id, then=Value(status)) for tx_id, (status, response) in results.items()],
+                    output_field=models.CharField()),
+        rehive_response=Case(*[When(id=tx_id, then=Value(response, output_field=JSONField()))
+                               for tx_id, (status, response) in results.items()],
+                             output_field=JSONField()))
+
+
+def _flush_confirmations(model, batch_size: int) -> int:
+    txs = list(model.objects.filter(status='Confirmed')
+               .exclude(rehive_code=None)
+               .order_by('id')
+               .values_list('id', 'rehive_code')[:batch_size])
+    if not txs:
+        return 0
+
+    workers = getattr(settings, 'REHIVE_CONFIRM_WORKERS', 10)
+    with ThreadPoolExecutor(max_workers=min(workers, len(txs))) as executor:
+        outcomes = executor.map(_post_confirmation, [tx_code for tx_id, tx_code in txs])
+        # Transactions with connection errors stay Confirmed and are retried on the next flush:
+        results = {tx_id: outcome for (tx_id, tx_code), outcome in zip(txs, outcomes) if outcome}
+
+    if results:
+        _bulk_update_statuses(model, results)
+
+    return len(results)
+
+
+@shared_task(name='adapter.flush_rehive_confirmations.task')
+def flush_rehive_confirmations():
+    """
+    Confirms all pending send and receive transactions on Rehive in batches.
+    """
+    if not _batching_enabled():
+        return
+
+    # Only one flush may run at a time across all worker processes:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, 0)', [FLUSH_LOCK_NAMESPACE])
+        if not cursor.fetchone()[0]:
+            return
+
+    try:
+        batch_size = getattr(settings, 'REHIVE_CONFIRM_BATCH_SIZE', 100)
+        for model in (SendTransaction, ReceiveTransaction):
+            while _flush_confirmations(model, batch_size) == batch_size:
+                pass
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, 0)', [FLUSH_LOCK_NAMESPACE])
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import Counter
+from logging import getLogger
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+logger = getLogger('django')
+
+# Statuses that are safe to retry for idempotent requests:
+RETRY_STATUSES = (502, 503, 504)
+
+
+class RehiveMetrics:
+    """
+    In-process request counters for the Rehive API, per path.
+    Every `log_interval` seconds the counters are logged and reset, so each log line covers one interval.
+    """
+
+    def __init__(self, log_interval=None):
+        if log_interval is None:
+            log_interval = getattr(settings, 'REHIVE_METRICS_LOG_INTERVAL', 300)
+        self._lock = threading.Lock()
+        self.log_interval = log_interval
+        self._logged = time.monotonic()
+        self.statuses = Counter()
+        self.requests = Counter()
+        self.latency = Counter()
+        self.max_latency = {}
+
+    def record(self, path, status, latency):
+        with self._lock:
+            self.statuses[(path, status)] += 1
+            self.requests[path] += 1
+            self.latency[path] += latency
+            self.max_latency[path] = max(self.max_latency.get(path, 0), latency)
+
+        if self.log_interval and time.monotonic() - self._logged >= self.log_interval:
+            self.log()
+
+    def snapshot(self, reset=False) -> dict:
+        with self._lock:
+            snapshot = {path: {'requests': count,
+                               'avg_latency': self.latency[path] / count,
+                               'max_latency': self.max_latency[path],
+                               'statuses': {status: n for (p, status), n in self.statuses.items() if p == path}}
+                        for path, count in self.requests.items()}
+            if reset:
+                self.statuses.clear()
+                self.requests.clear()
+                self.latency.clear()
+                self.max_latency.clear()
+                self._logged = time.monotonic()
+            return snapshot
+
+    def log(self):
+        logger.info('Rehive API requests in process %s: %s' % (os.getpid(), self.snapshot(reset=True)))
+
+
+class RehiveClient:
+    """
+    Client for the Rehive admin API.
+    Requests share a pooled keep-alive session, have connect and read timeouts,
+    and connection errors are retried with exponential backoff.
+    """
+
+    def __init__(self, url=None, token=None):
+        self.url = url or getattr(settings, 'REHIVE_API_URL')
+        self.token = token or getattr(settings, 'REHIVE_API_TOKEN')
+        self.timeout = (getattr(settings, 'REHIVE_API_CONNECT_TIMEOUT', 5),
+                        getattr(settings, 'REHIVE_API_READ_TIMEOUT', 30))
+        self.retries = getattr(settings, 'REHIVE_API_RETRIES', 3)
+        self.backoff = getattr(settings, 'REHIVE_API_BACKOFF', 0.5)
+        self.metrics = RehiveMetrics()
+
+        # Only connection errors are retried by the adapter, as the request was never received:
+        retry = Retry(total=self.retries, connect=self.retries, read=0, status=0, backoff_factor=self.backoff)
+        adapter = HTTPAdapter(pool_maxsize=getattr(settings, 'REHIVE_API_POOL_SIZE', 10), max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = 'Token ' + self.token
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, path, data, idempotent=False) -> requests.Response:
+        """
+        Posts JSON data to a Rehive API path.
+        Idempotent requests are also retried on gateway errors.
+        """
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            response = self.session.post(self.url + path, json=data, timeout=self.timeout)
+            latency = time.monotonic() - start
+
+            self.metrics.record(path, response.status_code, latency)
+            logger.debug('Rehive %s: HTTP %s in %.3fs' % (path, response.status_code, latency))
+
+            if not idempotent or response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                return response
+
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+
+_client = None
+_client_pid = None
+
+
+def get_client() -> RehiveClient:
+    """
+    Returns the Rehive client for the current process.
+    A new client is created after a fork so that pooled connections are never shared between processes.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = RehiveClient()
+        _client_pid = os.getpid()
+    return _client
+
+
+def set_client(client):
+    """
+    Replaces the Rehive client of the current process, such as with one for a local stand-in.
+    Passing None restores the default client on the next request.
+    """
+    global _client, _client_pid
+    _client = client
+    _client_pid = os.getpid() if client is not None else None
@@ -1,16 +1,21 @@
+import json
 from collections import OrderedDict
+from http.client import responses
 from logging import getLogger
+from urllib.parse import parse_qs
 
 import requests
 import toml
 from django.conf import settings
-from rest_framework.exceptions import MethodNotAllowed, ValidationError, ParseError
+from django.core.signals import request_finished, request_started
+from rest_framework.exceptions import APIException, MethodNotAllowed, PermissionDenied, ValidationError, ParseError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .cache import TTLCache, get_shared_cache
 from .exceptions import NotImplementedAPIError
 from .models import UserAccount
-from .permissions import AdapterGlobalPermission
+from .permissions import AdapterGlobalPermission, has_secret
 from .throttling import NoThrottling
 
 logger = getLogger('django')
@@ -18,22 +23,63 @@ logger = getLogger('django')
 STELLAR_WALLET_DOMAIN = 'rehive.com'
 
 
+# Parsed stellar.toml documents and federation responses:
+resolution_cache = TTLCache(maxsize=getattr(settings, 'STELLAR_FEDERATION_CACHE_SIZE', 10000),
+                            ttl=getattr(settings, 'STELLAR_FEDERATION_CACHE_TTL', 300))
+
+# Failed lookups are cached briefly so a failing domain is not hit on every send:
+FEDERATION_ERROR_TTL = getattr(settings, 'STELLAR_FEDERATION_ERROR_TTL', 30)
+FEDERATION_TIMEOUT = getattr(settings, 'STELLAR_FEDERATION_TIMEOUT', 10)
+
+
+def _resolve(key, loader):
+    """
+    Resolves a value through the in-process cache, then the shared cache, then the loader.
+    """
+    def load():
+        shared_cache = get_shared_cache()
+        if shared_cache is None:
+            return loader()
+
+        shared_key = 'adapter:federation:' + ':'.join(key)
+        value = shared_cache.get(shared_key)
+        if value is None:
+            value = loader()
+            shared_cache.set(shared_key, value, resolution_cache.ttl)
+        return value
+
+    return resolution_cache.get_or_load(key, load, error_ttl=FEDERATION_ERROR_TTL)
+
+
+def get_stellar_toml(domain):
+    def load():
+        logger.info('Fetching stellar.toml for domain: %s' % (domain,))
+        response = requests.get('https://' + domain + '/.well-known/stellar.toml', timeout=FEDERATION_TIMEOUT)
+        response.raise_for_status()
+        return toml.loads(response.text)
+
+    return _resolve(('toml', domain), load)
+
+
 def get_federation_details(address):
     if '*' not in address:
         raise TypeError('Invalid federation address')
     user_id, domain = address.split('*')
-    stellar_toml = requests.get('https://' + domain + '/.well-known/stellar.toml')
-    url = toml.loads(stellar_toml.text)['FEDERATION_SERVER']
-    params = {'type': 'name',
-              'q': address}
-    federation = requests.get(url=url, params=params).json()
-    return federation
+
+    def load():
+        url = get_stellar_toml(domain)['FEDERATION_SERVER']
+        params = {'type': 'name',
+                  'q': address}
+        response = requests.get(url=url, params=params, timeout=FEDERATION_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    return _resolve(('name', address), load)
 
 
 def address_from_domain(domain, code):
     logger.info('Fetching address from domain.')
-    stellar_toml = requests.get('https://' + domain + '/.well-known/stellar.toml')
-    currencies = toml.loads(stellar_toml.text)['CURRENCIES']
+    currencies = get_stellar_toml(domain)['CURRENCIES']
 
     for currency in currencies:
         if currency['code'] == code:
@@ -41,6 +87,103 @@ def address_from_domain(domain, code):
             return currency['issuer']
 
 
+# Stellar addresses known to exist (or not) for answering federation queries:
+federation_index = TTLCache(maxsize=getattr(settings, 'STELLAR_FEDERATION_INDEX_SIZE', 100000),
+                            ttl=getattr(settings, 'STELLAR_FEDERATION_INDEX_TTL', 60))
+
+
+def _federation_record(address):
+    return OrderedDict([('stellar_address', address),
+                        ('account_id', getattr(settings, 'STELLAR_RECEIVE_ADDRESS')),
+                        ('memo_type', 'text'),
+                        ('memo', address.split('*')[0])])
+
+
+def address_exists(address) -> bool:
+    """
+    Checks whether a stellar address belongs to a user account, using the federation index.
+    """
+    def load():
+        shared_cache = get_shared_cache()
+        shared_key = 'adapter:federation:index:' + address
+        exists = shared_cache.get(shared_key) if shared_cache else None
+        if exists is None:
+            exists = UserAccount.objects.filter(account_id=address).exists()
+            if shared_cache:
+                shared_cache.set(shared_key, exists, federation_index.ttl)
+        return exists
+
+    return federation_index.get_or_load(address, load)
+
+
+def invalidate_address(address):
+    federation_index.delete(address)
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        shared_cache.delete('adapter:federation:index:' + address)
+
+
+def resolve_federation_query(params) -> dict:
+    """
+    Answers a federation query.
+    Supports `type=name` lookups and `type=id` reverse lookups of the operating
+    receive account, which require the user's memo in the `memo` parameter.
+    """
+    query_type = params.get('type')
+    query = params.get('q')
+
+    if query_type not in ('name', 'id'):
+        raise NotImplementedAPIError()
+
+    if not query:
+        raise ParseError('Invalid query parameter provided.')
+
+    if query_type == 'name':
+        address = query
+    else:
+        memo = params.get('memo')
+        if query != getattr(settings, 'STELLAR_RECEIVE_ADDRESS') or not memo:
+            raise ValidationError('Account id does not exist.')
+        address = memo + '*' + getattr(settings, 'STELLAR_WALLET_DOMAIN', STELLAR_WALLET_DOMAIN)
+
+    if not address_exists(address):
+        raise ValidationError('Stellar address does not exist.')
+
+    return _federation_record(address)
+
+
+def federation_headers():
+    return {'Cache-Control': 'max-age=%s' % (federation_index.ttl,),
+            'Access-Control-Allow-Origin': '*'}
+
+
+def federation_application(environ, start_response):
+    """
+    Minimal WSGI application answering federation queries without the Django request stack.
+    Requests are held to the same secret key as StellarFederationView.
+    """
+    # Let Django reset queries and close stale database connections, as it does around each of its own requests:
+    request_started.send(sender=federation_application, environ=environ)
+    headers = {'Content-Type': 'application/json'}
+    try:
+        if not has_secret(getattr(settings, 'ADAPTER_SECRET_KEY'), environ):
+            raise PermissionDenied()
+
+        if environ['REQUEST_METHOD'] != 'GET':
+            raise MethodNotAllowed(environ['REQUEST_METHOD'])
+
+        params = {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        status, body = 200, resolve_federation_query(params)
+        headers.update(federation_headers())
+    except APIException as exc:
+        status, body = exc.status_code, {'detail': exc.detail}
+    finally:
+        request_finished.send(sender=federation_application)
+
+    start_response('%s %s' % (status, responses[status]), list(headers.items()))
+    return [json.dumps(body).encode('utf-8')]
+
+
 class StellarFederationView(APIView):
     allowed_methods = ('GET',)
     throttle_classes = (NoThrottling,)
@@ -50,19 +193,4 @@ class StellarFederationView(APIView):
         raise MethodNotAllowed('POST')
 
     def get(self, request, *args, **kwargs):
-        if request.query_params.get('type') == 'name':
-            address = request.query_params.get('q')
-            if address:
-                account_id = address
-                operating_receive_address = getattr(settings, 'STELLAR_RECEIVE_ADDRESS')
-                if UserAccount.objects.filter(account_id=account_id):
-                    return Response(OrderedDict([('stellar_address', address),
-                                                 ('account_id', operating_receive_address),
-                                                 ('memo_type', 'text'),
-                                                 ('memo', address.split('*')[0])]))
-                else:
-                    raise ValidationError('Stellar address does not exist.')
-            else:
-                raise ParseError('Invalid query parameter provided.')
-        else:
-            raise NotImplementedAPIError()
\ No newline at end of file
+        return Response(resolve_federation_query(request.query_params), headers=federation_headers())
@@ -0,0 +1,122 @@
+"""
+Test helpers that run the adapter against local Horizon and Rehive stand-ins and hold
+endpoints and tasks to a budget of database queries and outbound HTTP requests.
+"""
+import threading
+from contextlib import contextmanager
+
+from celery import current_app
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from requests.adapters import HTTPAdapter
+from stellar_base.keypair import Keypair
+
+from . import rehive_client
+from .benchmarks.stubs import HorizonStub, RehiveStub
+from .cache import admin_account_cache, asset_registry, destination_cache, user_account_cache
+from .rehive_client import RehiveClient
+from .stellar_federation import federation_index, resolution_cache
+
+# Statements issued by nested atomic blocks, which only exist because each test runs in a transaction:
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class CaptureHTTPRequests:
+    """
+    Records every outbound HTTP request made with requests, from any thread, while active.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+        self._send = None
+
+    def __enter__(self):
+        capture = self
+        self._send = send = HTTPAdapter.send
+
+        def capturing_send(adapter, request, *args, **kwargs):
+            with capture._lock:
+                capture.requests.append('%s %s' % (request.method, request.url))
+            return send(adapter, request, *args, **kwargs)
+
+        HTTPAdapter.send = capturing_send
+        return self
+
+    def __exit__(self, *exc_info):
+        HTTPAdapter.send = self._send
+
+    def __len__(self):
+        return len(self.requests)
+
+
+class StandInTestCase(TestCase):
+    """
+    Runs tests against local Horizon and Rehive stand-ins, with Celery tasks executed eagerly
+    and all in-process caches cleared before each test.
+    """
+    admin_keypair = Keypair.from_raw_seed(bytes(range(32)))
+    admin_address = admin_keypair.address().decode()
+    destination_address = Keypair.from_raw_seed(bytes(range(1, 33))).address().decode()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.horizon = HorizonStub(cls.admin_address).start()
+        cls.rehive = RehiveStub().start()
+        cls._settings = override_settings(STELLAR_HORIZON_URL=cls.horizon.url,
+                                          STELLAR_RECEIVE_ADDRESS=cls.admin_address,
+                                          STELLAR_WALLET_DOMAIN='rehive.com',
+                                          ADAPTER_SECRET_KEY='secret',
+                                          REHIVE_CONFIRM_BATCHING=False,
+                                          STELLAR_SEND_BATCHING=False)
+        cls._settings.enable()
+        cls._always_eager = current_app.conf.CELERY_ALWAYS_EAGER
+        current_app.conf.CELERY_ALWAYS_EAGER = True
+        super(StandInTestCase, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(StandInTestCase, cls).tearDownClass()
+        current_app.conf.CELERY_ALWAYS_EAGER = cls._always_eager
+        cls._settings.disable()
+        cls.horizon.stop()
+        cls.rehive.stop()
+
+    def setUp(self):
+        from .api import _interfaces
+        rehive_client.set_client(RehiveClient(url=self.rehive.url, token='test'))
+        self.horizon.reset()
+        self.horizon.reset_counts()
+        self.rehive.reset_counts()
+
+        for ttl_cache in (admin_account_cache, user_account_cache, destination_cache, federation_index,
+                          resolution_cache):
+            ttl_cache.clear()
+        asset_registry.invalidate()
+        _interfaces.clear()
+        cache.clear()
+
+    def tearDown(self):
+        rehive_client.set_client(None)
+
+    @contextmanager
+    def assertBudget(self, queries, requests=0):
+        """
+        Fails if the block makes more than `queries` database queries or more than `requests`
+        outbound HTTP requests, listing every query and request that was made.
+        """
+        with CaptureQueriesContext(connection) as captured, CaptureHTTPRequests() as http:
+            yield
+
+        statements = [query['sql'] for query in captured.captured_queries
+                      if not query['sql'].startswith(TRANSACTION_CONTROL)]
+        if len(statements) <= queries and len(http) <= requests:
+            return
+
+        report = ['Budget of %s queries and %s HTTP requests exceeded: %s queries, %s HTTP requests.'
+                  % (queries, requests, len(statements), len(http))]
+        report.extend('SQL %s: %s' % (i, sql) for i, sql in enumerate(statements, 1))
+        report.extend('HTTP %s: %s' % (i, request) for i, request in enumerate(http.requests, 1))
+        self.fail('\n'.join(report))
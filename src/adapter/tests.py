@@ -1,3 +1,290 @@
-from django.test import TestCase
+import json
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from .amounts import from_rehive_units, from_units, parse_amount, rescale, to_rehive_units, to_units
+from .api import execute_send, get_interface, submit_pending_sends
+from .benchmarks.stubs import HorizonStub
+from .models import AdminAccount, Asset, UserAccount, ReceiveTransaction, SendTransaction
+from .rehive_api import (confirm_rehive_transaction, create_or_confirm_rehive_receive, create_rehive_receives,
+                         flush_rehive_confirmations)
+from .testing import StandInTestCase
+
+
+class AmountTests(SimpleTestCase):
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount('10.0000000'), 100000000)
+        self.assertEqual(parse_amount('0.0000001'), 1)
+        self.assertEqual(parse_amount('-1.5'), -15000000)
+        self.assertEqual(parse_amount('7'), 70000000)
+        self.assertEqual(parse_amount('1.00000000'), 10000000)
+        for value in ('', '.', '1.2.3', 'abc', '1.00000001'):
+            with self.assertRaises(ValueError):
+                parse_amount(value)
+
+    def test_rescale_rounding(self):
+        self.assertEqual(rescale(15, 1, 0), 1)
+        self.assertEqual(rescale(-15, 1, 0), -1)
+        self.assertEqual(rescale(11, 1, 0, ROUND_UP), 2)
+        self.assertEqual(rescale(15, 1, 0, ROUND_HALF_UP), 2)
+        self.assertEqual(rescale(25, 1, 0, ROUND_HALF_EVEN), 2)
+        self.assertEqual(rescale(35, 1, 0, ROUND_HALF_EVEN), 4)
+        self.assertEqual(rescale(3, 7, 8), 30)
+
+    def test_rehive_round_trip(self):
+        self.assertEqual(to_rehive_units(Decimal('1.2345678'), 'XLM'), 123456780)
+        # Amounts finer than a stroop are never rounded up:
+        self.assertEqual(from_rehive_units(123456789, 'XLM'), Decimal('1.2345678'))
+        self.assertEqual(from_units(to_units(Decimal('0.1'), 7), 7), Decimal('0.1'))
+
+
+class QueryBudgetTestCase(StandInTestCase):
+    """
+    Each endpoint and task is held to the queries and outbound requests it needs, starting from cold caches.
+    """
+
+    def setUp(self):
+        super(QueryBudgetTestCase, self).setUp()
+        self.admin = AdminAccount.objects.create(name='receive', default=True, account_id=self.admin_address,
+                                                 network='TESTNET', secret=self.admin_keypair.seed().decode())
+        self.xlm = Asset.objects.create(code='XLM', divisibility=7)
+
+    def create_users(self, count):
+        UserAccount.objects.bulk_create(UserAccount(rehive_id='user-%s' % (i,),
+                                                    account_id='user%s*rehive.com' % (i,),
+                                                    admin_account=self.admin)
+                                        for i in range(count))
+        return list(UserAccount.objects.order_by('id'))
+
+    def create_sends(self, count, status='Pending'):
+        SendTransaction.objects.bulk_create(SendTransaction(admin_account=self.admin,
+                                                            rehive_code='send-%s' % (i,),
+                                                            recipient=self.destination_address,
+                                                            amount=Decimal('1.0000000'),
+                                                            asset=self.xlm,
+                                                            status=status)
+                                            for i in range(count))
+        return list(SendTransaction.objects.order_by('id'))
+
+
+class EndpointQueryBudgetTests(QueryBudgetTestCase):
+
+    def get(self, name, data=None):
+        return self.client.get(reverse('adapter-api:' + name), data, HTTP_AUTHORIZATION='Secret secret')
+
+    def post(self, name, data):
+        return self.client.post(reverse('adapter-api:' + name), json.dumps(data), content_type='application/json',
+                                HTTP_AUTHORIZATION='Secret secret')
+
+    @override_settings(STELLAR_SEND_BATCHING=True)
+    def test_send(self):
+        data = {'tx_code': 'tx-1', 'to_user': self.destination_address, 'amount': 100000000, 'currency': 'XLM'}
+
+        with self.assertBudget(queries=4):
+            response = self.post('send', data)
+        self.assertEqual(response.status_code, 200)
+
+        # Retried webhooks only look up the existing transaction:
+        with self.assertBudget(queries=1):
+            response = self.post('send', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(SendTransaction.objects.count(), 1)
+
+    def test_user_account(self):
+        with self.assertBudget(queries=3):
+            response = self.post('user_account', {'user_id': 'user-1', 'metadata': {'username': 'user1'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['account_id'], 'user1*rehive.com')
+
+    def test_federation(self):
+        self.create_users(1)
+        query = {'type': 'name', 'q': 'user0*rehive.com'}
+
+        with self.assertBudget(queries=1):
+            response = self.get('federation', query)
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertBudget(queries=0):
+            self.get('federation', query)
+
+    def test_operating_balance(self):
+        with self.assertBudget(queries=1, requests=1):
+            response = self.get('operating_balance')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertBudget(queries=0, requests=0):
+            self.get('operating_balance')
+
+    def test_operating_account(self):
+        with self.assertBudget(queries=1):
+            response = self.get('operating_account')
+        self.assertEqual(response.data['account_id'], self.admin_address)
+
+
+class ReceiveIngestionTests(QueryBudgetTestCase):
+
+    def test_mixed_page(self):
+        self.create_users(5)
+        # Outgoing payments are listed among the account's payments as well:
+        self.horizon.add_payments(['user0', 'user1'])
+        self.horizon.add_payments(['send-0'], source=self.admin_address, destination=self.destination_address)
+        self.horizon.add_payments(['user2', 'user3', 'user4'])
+
+        self.assertEqual(self.admin.process_receives(), 5)
+        self.assertEqual(sorted(ReceiveTransaction.objects.values_list('memo', flat=True)),
+                         ['user0', 'user1', 'user2', 'user3', 'user4'])
+
+        interface = get_interface(self.admin)
+        self.assertEqual(interface.receive_stats, {'incoming': 5, 'outgoing': 1})
+
+        # Stats only cover the latest run:
+        self.horizon.add_payments(['user0'])
+        self.assertEqual(self.admin.process_receives(), 1)
+        self.assertEqual(interface.receive_stats, {'incoming': 1})
+
+    def test_multiple_payments_and_replay(self):
+        self.create_users(2)
+        self.horizon.add_payments(['user0'])
+        # Both payments of a transaction share its hash:
+        self.horizon.add_transaction('user1', ['1.0000000', '2.0000000'])
+
+        self.assertEqual(self.admin.process_receives(), 3)
+        self.assertEqual(list(ReceiveTransaction.objects.filter(memo='user1').order_by('paging_token')
+                              .values_list('amount', 'transaction_hash')),
+                         [(Decimal('1'), '%064x' % (2,)), (Decimal('2'), '%064x' % (2,))])
+
+        # Replaying the pages from the start does not ingest any payment twice:
+        AdminAccount.objects.filter(id=self.admin.id).update(receive_cursor='0')
+        self.assertEqual(self.admin.process_receives(), 0)
+        self.assertEqual(ReceiveTransaction.objects.count(), 3)
+
+    def test_replay_after_archive(self):
+        self.create_users(1)
+        self.horizon.add_payments(['user0', 'user0'])
+        self.assertEqual(self.admin.process_receives(), 2)
+
+        ReceiveTransaction.objects.update(status='Complete')
+        call_command('archive_transactions', days=0)
+        self.assertFalse(ReceiveTransaction.objects.exists())
+
+        # Archived payments are not ingested again:
+        AdminAccount.objects.filter(id=self.admin.id).update(receive_cursor='0')
+        self.assertEqual(self.admin.process_receives(), 0)
+        self.assertFalse(ReceiveTransaction.objects.exists())
+
+
+class SendOutcomeTests(QueryBudgetTestCase):
+
+    def fail_submissions(self, error):
+        self.horizon.error_rate = 1.0
+        self.horizon.submit_error = error
+        self.addCleanup(setattr, self.horizon, 'error_rate', 0.0)
+        self.addCleanup(setattr, self.horizon, 'submit_error', HorizonStub.TX_FAILED)
+
+    def test_unknown_outcome(self):
+        tx = self.create_sends(1)[0]
+        self.fail_submissions((504, {'status': 504, 'title': 'Timeout'}))
+
+        execute_send(tx.id)
+
+        # The transaction may still be applied, so the send is neither failed nor retried:
+        tx = SendTransaction.objects.get(id=tx.id)
+        self.assertEqual(tx.status, 'Unknown')
+        self.assertEqual(tx.external_id, tx.data['hash'])
+        self.assertEqual(tx.data['sequence'], self.horizon.sequence + 1)
+        self.assertEqual(self.horizon.request_counts().get(('POST', '/transactions')), 1)
+
+    @override_settings(STELLAR_SEND_BATCHING=True)
+    def test_failed_transaction(self):
+        self.create_sends(2)
+        self.fail_submissions(HorizonStub.TX_FAILED)
+
+        submit_pending_sends()
+
+        # The shared transaction failed, so each send was retried on its own:
+        self.assertEqual(SendTransaction.objects.filter(status='Failed').count(), 2)
+        self.assertEqual(self.horizon.request_counts().get(('POST', '/transactions')), 3)
+
+
+class TaskQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_process_receives(self):
+        self.create_users(5)
+        # A full page and a partial page of payments:
+        self.horizon.add_payments(['user%s' % (i % 5,) for i in range(250)])
+
+        # Cursor lookups, 6 queries for the first page and 4 for the second.
+        # Requests for both pages and each payment's transaction:
+        with self.assertBudget(queries=12, requests=252):
+            processed = self.admin.process_receives()
+        self.assertEqual(processed, 250)
+
+    def test_execute_send(self):
+        tx = self.create_sends(1)[0]
+
+        # Requests for the sequence number, the destination account and the submission:
+        with self.assertBudget(queries=9, requests=3):
+            execute_send(tx.id)
+        self.assertEqual(SendTransaction.objects.get(id=tx.id).status, 'Confirmed')
+
+    @override_settings(STELLAR_SEND_BATCHING=True)
+    def test_submit_pending_sends(self):
+        self.create_sends(10)
+
+        with self.assertBudget(queries=10, requests=3):
+            submit_pending_sends()
+        self.assertEqual(SendTransaction.objects.filter(status='Confirmed').count(), 10)
+
+    def test_create_or_confirm_rehive_receive(self):
+        user_account = self.create_users(1)[0]
+        tx = ReceiveTransaction.objects.create(admin_account=self.admin, user_account=user_account,
+                                               external_id='hash', recipient=user_account.rehive_id,
+                                               amount=Decimal('1.0000000'), asset=self.xlm, status='Confirmed')
+
+        with self.assertBudget(queries=3, requests=2):
+            create_or_confirm_rehive_receive(tx.id, confirm=True)
+        self.assertEqual(ReceiveTransaction.objects.get(id=tx.id).status, 'Complete')
+
+    @override_settings(REHIVE_CONFIRM_BATCHING=True)
+    def test_create_rehive_receives(self):
+        user_account = self.create_users(1)[0]
+        txs = [ReceiveTransaction.objects.create(admin_account=self.admin, user_account=user_account,
+                                                 external_id='op-%s' % i, recipient=user_account.rehive_id,
+                                                 amount=Decimal('1.0000000'), asset=self.xlm, status='Pending')
+               for i in range(10)]
+
+        # One query to load the receives and one to update them all:
+        with self.assertBudget(queries=2, requests=10):
+            create_rehive_receives([tx.id for tx in txs])
+        self.assertEqual(ReceiveTransaction.objects.filter(status='Confirmed').exclude(rehive_code=None).count(), 10)
+
+    def test_confirm_rehive_transaction(self):
+        tx = self.create_sends(1, status='Confirmed')[0]
+
+        with self.assertBudget(queries=2, requests=1):
+            confirm_rehive_transaction(tx.id, 'send')
+        self.assertEqual(SendTransaction.objects.get(id=tx.id).status, 'Complete')
+
+    @override_settings(REHIVE_CONFIRM_BATCHING=True)
+    def test_flush_rehive_confirmations(self):
+        self.create_sends(10, status='Confirmed')
+
+        # Taking and releasing the lock, one query to find and one to update the sends, one to find no receives:
+        with self.assertBudget(queries=5, requests=10):
+            flush_rehive_confirmations()
+        self.assertEqual(SendTransaction.objects.filter(status='Complete').count(), 10)
+
+    def test_total_amount(self):
+        txs = self.create_sends(4)
+        # Transactions saved before integer amounts were stored only have decimal amounts:
+        SendTransaction.objects.filter(id__in=[tx.id for tx in txs[:2]]).update(amount_units=10000000)
+
+        with self.assertBudget(queries=2):
+            total = SendTransaction.objects.all().total_amount()
+        self.assertEqual(total, Decimal('4'))
+        self.assertEqual(SendTransaction.objects.get(id=txs[0].id).get_amount(), Decimal('1'))
@@ -2,6 +2,7 @@ from django.conf.urls import patterns, url, include
 from rest_framework.urlpatterns import format_suffix_patterns
 
 from . import views
+from .stellar_federation import StellarFederationView
 
 urlpatterns = (
     url(r'^purchase/$', views.PurchaseView.as_view(), name='purchase'),
@@ -11,6 +12,7 @@ urlpatterns = (
     url(r'^operating/balance/$', views.BalanceView.as_view(), name='operating_balance'),
     url(r'^operating/account/$', views.OperatingAccountView.as_view(), name='operating_account'),
     url(r'^user/account/$', views.UserAccountView.as_view(), name='user_account'),
+    url(r'^federation/$', StellarFederationView.as_view(), name='federation'),
     url(r'^hooks/(?P<hook_name>\w+)/$', views.WebhookView.as_view(), name='hooks'),
     url(r'^$', views.adapter_root)
 
@@ -2,6 +2,8 @@ import json
 import urllib.parse
 from decimal import Decimal
 
+from .amounts import to_units, from_units
+
 
 def input_to_json(metadata):
     if metadata:
@@ -14,11 +16,11 @@ def input_to_json(metadata):
 
 
 def to_cents(amount: Decimal, divisibility: int) -> int:
-    return int(amount * Decimal('10')**Decimal(divisibility))
+    return to_units(amount, divisibility)
 
 
 def from_cents(amount: int, divisibility: int) -> Decimal:
-    return Decimal(amount) / Decimal('10')**Decimal(divisibility)
+    return from_units(amount, divisibility)
 
 
 def create_qr_code_url(value, size=300):
@@ -11,10 +11,14 @@ from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_200_OK, HTTP_404_NOT_FOUND
 from rest_framework.views import APIView
 
-from .api import process_webhook_receive
-from .utils import from_cents, input_to_json
-from .api import Interface
-from .models import UserAccount, AdminAccount, SendTransaction, Currency, Asset
+from django.conf import settings
+
+from .api import process_webhook_receive, execute_send
+from .amounts import from_rehive_units
+from .utils import input_to_json
+from .api import get_interface
+from .cache import asset_registry
+from .models import UserAccount, AdminAccount, SendTransaction
 from .permissions import AdapterGlobalPermission
 
 from logging import getLogger
@@ -120,8 +124,8 @@ class SendView(GenericAPIView):
         logger.info('Received send request')
         tx_code = request.data.get('tx_code')
         to_user = request.data.get('to_user')
-        amount = from_cents(request.data.get('amount'), 8)
         currency = request.data.get('currency')
+        amount = from_rehive_units(request.data.get('amount'), currency)
         issuer = request.data.get('issuer')
 
         logger.debug(request.data)
@@ -129,16 +133,21 @@ class SendView(GenericAPIView):
         logger.info('Amount: ' + str(amount))
         logger.info('Currency: ' + currency)
 
-        asset = Asset.objects.get_or_create(code=currency)
-        tx = SendTransaction.objects.create(rehive_code=tx_code,
-                                            recipient=to_user,
-                                            amount=amount,
-                                            asset=asset,
-                                            issuer=issuer)
-        if tx.currency == 'XBT':
-            tx.execute()
+        asset = asset_registry.get_or_create(code=currency)
 
-        return Response({'status': 'success'})
+        # Rehive retries webhooks, so a transaction is only created and sent once per tx_code:
+        tx, created = SendTransaction.objects.get_or_create(rehive_code=tx_code,
+                                                            defaults={'recipient': to_user,
+                                                                      'amount': amount,
+                                                                      'asset': asset,
+                                                                      'issuer': issuer})
+        if not created:
+            logger.info('Duplicate send request: ' + tx_code)
+        elif not getattr(settings, 'STELLAR_SEND_BATCHING', False):
+            # Pending sends are otherwise picked up by the send batching task:
+            execute_send.delay(tx.id)
+
+        return Response({'status': 'success', 'data': {'id': tx.id, 'status': tx.status}})
 
     def get(self, request, *args, **kwargs):
         raise exceptions.MethodNotAllowed('GET')
@@ -153,10 +162,10 @@ class BalanceView(APIView):
         raise exceptions.MethodNotAllowed('POST')
 
     def get(self, request, *args, **kwargs):
-        account = AdminAccount.objects.get(default=True)
-        interface = Interface(account=account)
+        account = AdminAccount.objects.get_default()
+        interface = get_interface(account)
         balance_details = interface.get_account_balance()
-        return Response({'balance': balance_details})
+        return Response({'balance': balance_details, 'balances': interface.get_account_balances()})
 
 
 class OperatingAccountView(APIView):
@@ -168,8 +177,8 @@ class OperatingAccountView(APIView):
         raise exceptions.MethodNotAllowed('POST')
 
     def get(self, request, *args, **kwargs):
-        account = AdminAccount.objects.get(default=True)
-        interface = Interface(account=account)
+        account = AdminAccount.objects.get_default()
+        interface = get_interface(account)
         details = interface.get_account_details()
         return Response(details)
 
@@ -188,13 +197,10 @@ class UserAccountView(GenericAPIView):
         metadata = input_to_json(request.data.get('metadata'))
 
         # Get Account ID:
-        user_account, created = UserAccount.objects.get_or_create(rehive_id=user_id)
-
-        interface = Interface(account=user_account)
+        user_account, created = UserAccount.objects.get_or_create(rehive_id=user_id,
+                                                                  defaults={'metadata': metadata})
 
-        details = interface.get_user_account_details()
-
-        return Response(details)
+        return Response(user_account.get_details())
 
     def get(self, request, *args, **kwargs):
         raise exceptions.MethodNotAllowed('GET')
@@ -238,8 +244,8 @@ class AddAssetView(GenericAPIView):
         # Get Metadata:
         metadata = input_to_json(request.data.get('metadata'))
 
-        account = AdminAccount.objects.get(default=True)
-        interface = Interface(account=account)
+        account = AdminAccount.objects.get_default()
+        interface = get_interface(account)
 
         issuer_details = interface.get_or_create_asset(issuer, asset_code, metadata)
 
@@ -0,0 +1,18 @@
+"""
+WSGI config for the standalone federation server.
+
+Serves only Stellar federation queries, bypassing the Django middleware and
+URL routing used by the main application. Run it alongside the main app, e.g.
+`gunicorn config.federation_wsgi:application`.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from adapter.stellar_federation import federation_application
+
+application = federation_application
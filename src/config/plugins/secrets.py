@@ -37,6 +37,9 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET', 'dvznxtu08$$a9jxjh=jkkswbe5-dw5+ea%
 # Get the platform URL for the adapter (Rehive)
 REHIVE_API_URL = os.environ.get('REHIVE_API_URL', '')
 
+# Horizon server to use instead of the public one for the network (e.g. a local stand-in)
+STELLAR_HORIZON_URL = os.environ.get('STELLAR_HORIZON_URL', '')
+
 # Get the admin token for platform requests (Rehive)
 REHIVE_API_TOKEN = os.environ.get('REHIVE_API_TOKEN', '')
 
@@ -16,9 +16,57 @@ CELERY_DEFAULT_QUEUE = default_queue
 
 webhooks_queue = '-'.join(('webhooks', HOST_NAME))
 rehive_updates_queue = '-'.join(('rehive-updates', HOST_NAME))
+sends_queue = '-'.join(('sends', HOST_NAME))
 CELERY_ROUTES = {'adapter.tasks.process_webhook_receive': {'queue': webhooks_queue},
                  'adapter.tasks.confirm_rehive_transaction': {'queue': rehive_updates_queue},
-                 'adapter.tasks.create_or_confirm_rehive_receive': {'queue': rehive_updates_queue}}
+                 'adapter.tasks.create_or_confirm_rehive_receive': {'queue': rehive_updates_queue},
+                 'adapter.flush_rehive_confirmations.task': {'queue': rehive_updates_queue},
+                 'adapter.create_rehive_receives.task': {'queue': rehive_updates_queue},
+                 'adapter.execute_send.task': {'queue': sends_queue},
+                 'adapter.submit_pending_sends.task': {'queue': sends_queue},
+                 'adapter.reconcile_unknown_sends.task': {'queue': sends_queue}}
+
+# Cache shared by the web and worker processes, for balances and asset registry invalidation.
+# Kept in the database, so `manage.py createcachetable` must be run once it is enabled:
+ADAPTER_SHARED_CACHE = 'shared' if os.environ.get('ADAPTER_SHARED_CACHE', '') in ['True', True, 'true'] else None
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'adapter_shared_cache',
+    },
+}
+
+# Confirm transactions on Rehive in periodic batches instead of one task per transaction:
+REHIVE_CONFIRM_BATCHING = os.environ.get('REHIVE_CONFIRM_BATCHING', '') in ['True', True, 'true']
+REHIVE_CONFIRM_BATCH_SIZE = int(os.environ.get('REHIVE_CONFIRM_BATCH_SIZE', 100))
+
+# Pack pending sends into shared Stellar transactions on a short window instead of sending each on its own:
+STELLAR_SEND_BATCHING = os.environ.get('STELLAR_SEND_BATCHING', '') in ['True', True, 'true']
+
+CELERYBEAT_SCHEDULE = {
+    'submit-pending-sends': {
+        'task': 'adapter.submit_pending_sends.task',
+        'schedule': timedelta(seconds=int(os.environ.get('STELLAR_SEND_BATCH_INTERVAL', 2))),
+    },
+    'reconcile-unknown-sends': {
+        'task': 'adapter.reconcile_unknown_sends.task',
+        'schedule': timedelta(seconds=int(os.environ.get('STELLAR_SEND_RECONCILE_INTERVAL', 60))),
+    },
+    'flush-rehive-confirmations': {
+        'task': 'adapter.flush_rehive_confirmations.task',
+        'schedule': timedelta(seconds=int(os.environ.get('REHIVE_CONFIRM_BATCH_INTERVAL', 5))),
+    },
+}
+
+# Balances refreshed by workers are only visible to the web processes through the shared cache:
+if ADAPTER_SHARED_CACHE:
+    CELERYBEAT_SCHEDULE['refresh-account-balances'] = {
+        'task': 'adapter.refresh_account_balances.task',
+        'schedule': timedelta(seconds=int(os.environ.get('STELLAR_BALANCE_REFRESH_INTERVAL', 30))),
+    }
 
 BROKER_TRANSPORT = 'sqs'
 BROKER_TRANSPORT_OPTIONS = {